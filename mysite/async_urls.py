@@ -0,0 +1,7 @@
+"""
+The URL patterns of the site with the async polls views, used as the
+ROOT_URLCONF when settings.POLLS_ASYNC_VIEWS is on.
+"""
+from .urls import project_urlpatterns
+
+urlpatterns = project_urlpatterns('polls.async_urls')
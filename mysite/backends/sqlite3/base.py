@@ -0,0 +1,34 @@
+"""
+The SQLite backend of Django, tuned for serving concurrent requests.
+
+Every new connection switches the database to write-ahead logging, so
+readers do not block the writer, and applies the PRAGMAS below, which
+OPTIONS['pragmas'] of the database settings can extend or override. The
+busy timeout is the 'timeout' option of the standard backend.
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Safe with WAL: a power loss may only lose the last transactions.
+    'synchronous': 'NORMAL',
+    # 20 MB of page cache per connection.
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+    'mmap_size': 128 * 1024 * 1024,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        pragmas = {**PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas',
+                                                                  {})}
+        for name, value in pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
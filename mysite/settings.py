@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from decouple import config, Csv
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'polls.middleware.QueryMetricsMiddleware',
+    'polls.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,14 +55,27 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'mysite.urls'
+# Serve the polls pages with the async views of polls/async_views.py, for
+# deployments on an ASGI server (mysite/asgi.py).
+
+POLLS_ASYNC_VIEWS = config('ASYNC_VIEWS', cast=bool, default=False)
+
+ROOT_URLCONF = 'mysite.async_urls' if POLLS_ASYNC_VIEWS else 'mysite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django template backend, timing renders for the metrics.
+        'BACKEND': 'polls.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Templates are compiled once per process, also with DEBUG on
+            # (runserver still reloads them when they change).
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -74,14 +91,140 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# DATABASE_URL selects SQLite, PostgreSQL or MySQL (see mysite/database.py).
+# Connections are kept open for CONN_MAX_AGE seconds between requests and
+# checked before reuse when CONN_HEALTH_CHECKS is on (set CONN_MAX_AGE to 0
+# under ASGI, where requests do not reuse threads). Set DATABASE_POOLER
+# when connecting through a transaction pooler such as PgBouncer. SQLite
+# waits SQLITE_TIMEOUT seconds for locks held by other connections.
+
+DATABASE_OPTIONS = {
+    'conn_max_age': config('CONN_MAX_AGE', cast=int, default=60),
+    'health_checks': config('CONN_HEALTH_CHECKS', cast=bool, default=True),
+    'external_pool': config('DATABASE_POOLER', cast=bool, default=False),
+    'sqlite_timeout': config('SQLITE_TIMEOUT', cast=float, default=20),
+}
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    'default': database_config(
+        config('DATABASE_URL', default='sqlite:///db.sqlite3'), BASE_DIR,
+        **DATABASE_OPTIONS),
+}
+
+# Read replicas
+# DATABASE_REPLICA_URLS lists the URLs of read replicas of the default
+# database, as aliases 'replica1', 'replica2' and so on. The polls pages
+# read from them (see polls/routers.py), except for clients that wrote in
+# the last POLLS_REPLICA_PIN_SECONDS, which read from the primary.
+
+POLLS_REPLICAS = []
+
+for number, url in enumerate(config('DATABASE_REPLICA_URLS', cast=Csv(),
+                                    default=''), start=1):
+    DATABASES[f'replica{number}'] = {
+        **database_config(url, BASE_DIR, **DATABASE_OPTIONS),
+        'TEST': {'MIRROR': 'default'},
     }
+    POLLS_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['polls.routers.ReplicaRouter']
+
+POLLS_REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', cast=int,
+                                   default=10)
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# CACHE_BACKEND selects the default cache, which keeps cached sessions and
+# the validators of cached pages: local memory ('locmem', kept by each
+# worker process), files ('file', LOCATION is a directory shared by the
+# workers of one host) or Redis ('redis', LOCATION is a redis:// URL,
+# requires the redis package). CACHE_LOCATION overrides the location.
+# The 'votes' cache keeps the vote of each user for each question read by
+# the poll detail page. VOTE_CACHE_BACKEND selects it the same way. A vote
+# only updates the cache of the worker that took it, so a locmem cache is
+# exact for a single process only; with several workers use 'file' or
+# 'redis'. Entries expire after VOTE_CACHE_TIMEOUT seconds, which bounds
+# how long another worker may show a stale vote (60 seconds by default
+# with locmem, an hour otherwise). Locmem and file caches also cull
+# entries beyond VOTE_CACHE_MAX_ENTRIES.
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+
+SHARED_CACHE_BACKENDS = {'file', 'redis'}
+
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+
+CACHE_LOCATIONS = {
+    'locmem': 'polls',
+    'file': str(BASE_DIR / 'cache'),
+    'redis': 'redis://127.0.0.1:6379/0',
 }
 
+VOTE_CACHE_BACKEND = config('VOTE_CACHE_BACKEND', default='locmem')
+
+VOTE_CACHE_LOCATIONS = {
+    'locmem': 'polls-votes',
+    'file': str(BASE_DIR / 'vote-cache'),
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': config('CACHE_LOCATION',
+                           default=CACHE_LOCATIONS[CACHE_BACKEND]),
+    },
+    'votes': {
+        'BACKEND': CACHE_BACKENDS[VOTE_CACHE_BACKEND],
+        'LOCATION': config('VOTE_CACHE_LOCATION',
+                           default=VOTE_CACHE_LOCATIONS[VOTE_CACHE_BACKEND]),
+        'TIMEOUT': config('VOTE_CACHE_TIMEOUT', cast=int,
+                          default=60 if VOTE_CACHE_BACKEND == 'locmem'
+                          else 3600),
+        'OPTIONS': {} if VOTE_CACHE_BACKEND == 'redis' else {
+            'MAX_ENTRIES': config('VOTE_CACHE_MAX_ENTRIES', cast=int,
+                                  default=10000),
+        },
+    },
+}
+
+
+# Sessions and messages
+# https://docs.djangoproject.com/en/4.2/topics/http/sessions/
+# SESSION_BACKEND selects where sessions are kept: 'db' reads the session
+# table on every request, 'cached_db' reads it through the default cache
+# and writes through to the table, 'cache' keeps sessions in the default
+# cache only and 'signed_cookies' in the browser. Both cache backends need
+# a default cache shared by all workers, as a session changed or ended by
+# one worker is otherwise still read from the cache of the others; the
+# default is 'cached_db' with a shared CACHE_BACKEND and 'db' otherwise.
+# Flash messages are kept in a signed cookie ('cookie'), so they never
+# touch the session, or in the session ('session').
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+SESSION_ENGINE = SESSION_ENGINES[config(
+    'SESSION_BACKEND',
+    default='cached_db' if CACHE_BACKEND in SHARED_CACHE_BACKENDS else 'db')]
+
+MESSAGE_STORAGES = {
+    'cookie': 'django.contrib.messages.storage.cookie.CookieStorage',
+    'session': 'django.contrib.messages.storage.session.SessionStorage',
+}
+
+MESSAGE_STORAGE = MESSAGE_STORAGES[config('MESSAGE_BACKEND',
+                                          default='cookie')]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -133,28 +276,155 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Poll status
+# Set STATUS_UPDATES when the update_poll_status --watch command runs, to
+# filter the listings of the admin and the API by the materialized status
+# of the questions, which it keeps current. Otherwise they compare the
+# dates of the questions.
+
+POLLS_STATUS_UPDATES = config('STATUS_UPDATES', cast=bool, default=False)
+
+# Page cache
+# Anonymous visitors get the index and results pages from a cache, and
+# 304 Not Modified when their copy is current. Cached pages are dropped
+# when votes or polls change, and revalidated at least every
+# POLLS_PAGE_CACHE_TIMEOUT seconds as polls open and close (0 disables the
+# page cache). The modification times of the pages are kept in the default
+# cache: with a locmem CACHE_BACKEND, a change only drops the pages of the
+# worker that made it, and the other workers may serve their copy for up to
+# POLLS_PAGE_CACHE_TIMEOUT seconds (POLLS_INDEX_CACHE_TIMEOUT for the
+# index). A shared CACHE_BACKEND drops them everywhere at once.
+
+POLLS_PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', cast=int, default=60)
+
+# Poll index
+# Number of questions per index page, and how long (in seconds) a cached
+# index page may be served. Cached pages are dropped as soon as a question
+# or choice changes; the timeout bounds how late a poll is shown as opened
+# or ended when its dates pass.
+
+POLLS_INDEX_PAGE_SIZE = config('INDEX_PAGE_SIZE', cast=int, default=20)
+
+POLLS_INDEX_CACHE_TIMEOUT = config('INDEX_CACHE_TIMEOUT', cast=int,
+                                   default=60)
+
+# Number of questions per page of the JSON API (see polls/api.py).
+
+POLLS_API_PAGE_SIZE = config('API_PAGE_SIZE', cast=int, default=50)
+
+# Number of votes read per database round trip when exporting raw votes.
+
+POLLS_EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', cast=int, default=2000)
+
+# Live results
+# Results streams push new tallies at most once per LIVE_RESULTS_INTERVAL
+# seconds and end after LIVE_RESULTS_TIMEOUT seconds, when the browser
+# reconnects. They are only served by the async views.
+
+POLLS_LIVE_RESULTS_INTERVAL = config('LIVE_RESULTS_INTERVAL', cast=float,
+                                     default=1.0)
+
+POLLS_LIVE_RESULTS_TIMEOUT = config('LIVE_RESULTS_TIMEOUT', cast=int,
+                                    default=300)
+
+# Request metrics
+# Each metric keeps the last POLLS_METRICS_WINDOW requests of each view.
+# A warning is logged when a view runs more SQL queries than its budget
+# in POLLS_QUERY_BUDGETS (by URL name, or 'default' for other views).
+
+POLLS_METRICS_WINDOW = config('METRICS_WINDOW', cast=int, default=1000)
+
+POLLS_QUERY_BUDGETS = {
+    'index': 5,
+    'detail': 8,
+    'results': 5,
+    'vote': 12,
+    'signup': 15,
+    'api_questions': 1,
+    'api_question': 1,
+    'api_vote': 12,
+}
+
+# Rate limits
+# POST requests to the vote and signup views are limited per client IP
+# address and per logged in user. A limit such as '20/m' allows 20
+# requests per minute (or s, h, d), in bursts; over a limit, the views
+# answer 429 Too Many Requests. RATE_LIMIT_BACKEND 'locmem' counts them
+# in each worker process, 'cache' in the default cache, shared by the
+# workers using the same cache (see polls/ratelimit.py). IP addresses are
+# taken from the connection, or with TRUSTED_PROXIES reverse proxies in
+# front of the app, from the X-Forwarded-For entry the outermost one added.
+
+POLLS_RATE_LIMIT_BACKEND = config('RATE_LIMIT_BACKEND', default='locmem')
+
+POLLS_RATE_LIMITS = {
+    'vote': {
+        'ip': config('VOTE_RATE_LIMIT_IP', default='120/m'),
+        'user': config('VOTE_RATE_LIMIT_USER', default='30/m'),
+    },
+    'signup': {
+        'ip': config('SIGNUP_RATE_LIMIT_IP', default='10/h'),
+    },
+}
+
+POLLS_TRUSTED_PROXIES = config('TRUSTED_PROXIES', cast=int, default=0)
+
+# Vote ingestion
+# 'sync' writes each vote in the request, 'queued' journals the vote and
+# writes it later in a batch with other votes (see polls/ingest.py). Each
+# process journals into VOTE_JOURNAL.<pid>, and recovers the journals of
+# stopped processes on its first queued vote.
+
+POLLS_VOTE_INGESTION = config('VOTE_INGESTION', default='sync')
+
+POLLS_VOTE_JOURNAL = config('VOTE_JOURNAL',
+                            default=str(BASE_DIR / 'vote-journal.jsonl'))
+
+POLLS_VOTE_BATCH_SIZE = config('VOTE_BATCH_SIZE', cast=int, default=500)
+
+POLLS_VOTE_FLUSH_INTERVAL = config('VOTE_FLUSH_INTERVAL', cast=float,
+                                   default=1.0)
+
 # Logging configuration
 # https://docs.djangoproject.com/en/4.2/topics/logging/
+# The polls logger writes JSON lines to standard error from a background
+# thread (see polls/log.py), through a queue of LOG_QUEUE_SIZE records;
+# records logged while it is full are dropped and counted in the metrics.
+# LOG_SAMPLE_RATE is the fraction of routine vote events (logins and
+# votes) logged. Warnings and errors are always logged.
+
+POLLS_LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', cast=int, default=10000)
+
+POLLS_LOG_SAMPLE_RATES = dict.fromkeys(
+    ['vote.login', 'vote.cast', 'vote.queued'],
+    config('LOG_SAMPLE_RATE', cast=float, default=1.0))
 
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
+        'json': {
+            '()': 'polls.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'polls.log.SamplingFilter',
+            'rates': POLLS_LOG_SAMPLE_RATES,
         },
     },
     'handlers': {
-        'console': {
+        'queue': {
             'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            '()': 'polls.log.QueueLogHandler',
+            'maxsize': POLLS_LOG_QUEUE_SIZE,
+            'formatter': 'json',
+            'filters': ['sampling'],
         },
     },
     'loggers': {
         'polls': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': True,
         },
@@ -2,12 +2,20 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import RedirectView
 
+from polls.ratelimit import rate_limit
+
 from .views import signup
 
-urlpatterns = [
-    path('', RedirectView.as_view(url='/polls/')),
-    path('polls/', include('polls.urls')),
-    path('admin/', admin.site.urls),
-    path('accounts/', include('django.contrib.auth.urls')),
-    path('signup/', signup, name='signup')
-]
+
+def project_urlpatterns(polls_urlconf):
+    """Return the URL patterns of the site with the given polls URLconf."""
+    return [
+        path('', RedirectView.as_view(url='/polls/')),
+        path('polls/', include(polls_urlconf)),
+        path('admin/', admin.site.urls),
+        path('accounts/', include('django.contrib.auth.urls')),
+        path('signup/', rate_limit('signup')(signup), name='signup')
+    ]
+
+
+urlpatterns = project_urlpatterns('polls.urls')
@@ -1,7 +1,16 @@
+import datetime
+import time
+
 from django.contrib import admin
+from django.utils import timezone
 
+from .caching import ALL_PAGES, forget_votes, invalidate_index, touch_pages
+from .live import get_live_results
 from .models import Choice, Question
 
+# How long the extend action keeps the selected polls open.
+EXTEND_PERIOD = datetime.timedelta(days=7)
+
 
 class ChoiceInline(admin.TabularInline):
     """
@@ -12,6 +21,46 @@ class ChoiceInline(admin.TabularInline):
     extra = 3
 
 
+class TotalVotesFilter(admin.SimpleListFilter):
+    """
+    TotalVotesFilter filters the questions by their total votes, in SQL
+    on the annotated total.
+    """
+    title = 'total votes'
+    parameter_name = 'votes'
+    ranges = {
+        'none': {'total_votes': 0},
+        'few': {'total_votes__range': (1, 99)},
+        'many': {'total_votes__gte': 100},
+    }
+
+    def lookups(self, request, model_admin):
+        return [('none', 'No votes'), ('few', '1 to 99'),
+                ('many', '100 or more')]
+
+    def queryset(self, request, queryset):
+        if self.value() in self.ranges:
+            return queryset.filter(**self.ranges[self.value()])
+        return queryset
+
+
+class StatusFilter(admin.SimpleListFilter):
+    """
+    StatusFilter filters the questions by their status now, see
+    QuestionQuerySet.by_status().
+    """
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return Question.Status.choices
+
+    def queryset(self, request, queryset):
+        if self.value() in Question.Status.values:
+            return queryset.by_status(self.value(), timezone.now())
+        return queryset
+
+
 class QuestionAdmin(admin.ModelAdmin):
     """
     QuestionAdmin is responsible for configuring the questions in the /admin/.
@@ -23,9 +72,73 @@ class QuestionAdmin(admin.ModelAdmin):
     ]
     inlines = [ChoiceInline]
     list_display = ('question_text', 'pub_date', 'was_published_recently',
-                    'can_vote')
-    list_filter = ['pub_date']
+                    'current_status', 'choice_count', 'total_votes')
+    list_filter = [StatusFilter, TotalVotesFilter, 'pub_date']
     search_fields = ['question_text']
+    # Questions have no foreign keys to join, and counting every question
+    # of a filtered changelist is not worth a second full scan.
+    list_select_related = False
+    show_full_result_count = False
+    actions = ['close_polls', 'extend_polls', 'clone_polls', 'reset_votes']
+
+    def get_queryset(self, request):
+        """Annotate the questions with their vote totals in one query."""
+        return super().get_queryset(request).with_totals()
+
+    @admin.display(description='Status')
+    def current_status(self, question):
+        return question.status_at(timezone.now()).label
+
+    @admin.display(description='Choices', ordering='choice_count')
+    def choice_count(self, question):
+        return question.choice_count
+
+    @admin.display(description='Total votes', ordering='total_votes')
+    def total_votes(self, question):
+        return question.total_votes
+
+    def run_bulk(self, request, operation, message):
+        """
+        Run a set-based operation on the selected questions, drop the
+        cached pages it bypassed the signals of, and report its result
+        and duration.
+        """
+        started = time.monotonic()
+        result = operation()
+        invalidate_index()
+        touch_pages([ALL_PAGES])
+        elapsed = (time.monotonic() - started) * 1000
+        self.message_user(request, f'{message.format(result)} '
+                                   f'in {elapsed:.0f} ms.')
+
+    @admin.action(description='Close selected polls now')
+    def close_polls(self, request, queryset):
+        self.run_bulk(request, lambda: queryset.close(timezone.now()),
+                      'Closed {} poll(s)')
+
+    @admin.action(description=f'Extend or reopen selected polls by '
+                              f'{EXTEND_PERIOD.days} days')
+    def extend_polls(self, request, queryset):
+        self.run_bulk(request,
+                      lambda: queryset.extend(EXTEND_PERIOD, timezone.now()),
+                      'Extended {} poll(s)')
+
+    @admin.action(description='Clone selected polls with their choices')
+    def clone_polls(self, request, queryset):
+        self.run_bulk(request, lambda: len(queryset.clone(timezone.now())),
+                      'Cloned {} poll(s)')
+
+    @admin.action(description='Reset the votes of selected polls')
+    def reset_votes(self, request, queryset):
+        def reset():
+            # Selected before the reset, which may change the totals a
+            # filter of the changelist selects the questions by.
+            question_ids = list(queryset.values_list('pk', flat=True))
+            deleted = queryset.reset_votes()
+            forget_votes(deleted)
+            get_live_results().mark_changed(question_ids)
+            return len(deleted)
+        self.run_bulk(request, reset, 'Deleted {} vote(s)')
 
 
 admin.site.register(Question, QuestionAdmin)
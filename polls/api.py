@@ -0,0 +1,194 @@
+"""
+JSON API of the polls app, under /polls/api/.
+
+- GET questions/ lists the published questions, newest first, by pages
+  of settings.POLLS_API_PAGE_SIZE. ?state=open or ?state=closed filters
+  them, and the 'next' URL of a page points to the following page.
+- GET questions/<pk>/ returns a published question with the tallies of
+  its choices.
+- POST questions/<pk>/vote/ casts the vote of the logged in user for the
+  choice given as 'choice', in a JSON or form body. Like the vote form,
+  it needs the CSRF token of the session.
+
+Each GET endpoint runs a single SQL query, answers with an ETag of its
+content and 304 Not Modified when the client's copy is current, and
+accepts ?fields= with a comma separated list of the fields to return.
+"""
+import hashlib
+import json
+from logging import getLogger
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import urlencode
+from django.views.decorators.http import require_GET, require_POST
+
+from .log import vote_fields
+from .models import Choice, Question
+from .pagination import KeysetPage
+from .ratelimit import client_address
+from .views import record_vote
+
+QUESTION_FIELDS = ['id', 'question_text', 'pub_date', 'end_date', 'is_open',
+                   'total_votes', 'url']
+
+DETAIL_FIELDS = ['id', 'question_text', 'pub_date', 'end_date', 'is_open',
+                 'total_votes', 'choices']
+
+STATES = {'open': Question.Status.OPEN, 'closed': Question.Status.CLOSED}
+
+
+class BadRequest(Exception):
+    """A request the API cannot answer, with the reason for the client."""
+
+
+def error(message, status):
+    """Return a JSON error response."""
+    return JsonResponse({'error': message}, status=status)
+
+
+def selected_fields(request, available):
+    """
+    Return the fields requested with ?fields=, or every available field.
+
+    :raises BadRequest: if a requested field does not exist.
+    """
+    requested = request.GET.get('fields')
+    if not requested:
+        return available
+    fields = [field.strip() for field in requested.split(',')
+              if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}.")
+    return fields
+
+
+def conditional_json(request, data):
+    """
+    Return a JSON response of 'data' tagged with an ETag of its content,
+    or 304 Not Modified if the client already has it.
+    """
+    content = json.dumps(data, cls=DjangoJSONEncoder)
+    etag = f'"{hashlib.md5(content.encode()).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+    # Clients keep their copy but check it on every use.
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_GET
+def question_list(request):
+    """
+    question_list() returns a page of published questions, newest first,
+    with their open state and total votes.
+    """
+    try:
+        fields = selected_fields(request, QUESTION_FIELDS)
+        state = request.GET.get('state')
+        if state is not None and state not in STATES:
+            raise BadRequest("state must be 'open' or 'closed'.")
+    except BadRequest as exception:
+        return error(str(exception), 400)
+    now = timezone.now()
+    questions = Question.objects.published(now).with_open_state(now) \
+        .with_totals()
+    if state is not None:
+        questions = questions.by_status(STATES[state], now)
+    page = KeysetPage(questions, request.GET.get('after'),
+                      settings.POLLS_API_PAGE_SIZE)
+    results = []
+    for question in page:
+        item = {'id': question.id,
+                'question_text': question.question_text,
+                'pub_date': question.pub_date,
+                'end_date': question.end_date,
+                'is_open': question.is_open,
+                'total_votes': question.total_votes,
+                'url': reverse('polls:api_question', args=(question.id,))}
+        results.append({field: item[field] for field in fields})
+    next_url = None
+    if page.has_next:
+        params = {key: request.GET[key] for key in ('state', 'fields')
+                  if key in request.GET}
+        next_url = (f"{reverse('polls:api_questions')}?"
+                    f"{urlencode({**params, 'after': page.next_cursor})}")
+    return conditional_json(request, {'results': results, 'next': next_url})
+
+
+@require_GET
+def question_detail(request, pk):
+    """
+    question_detail() returns a published question with the votes and
+    percentage of each of its choices, read in one query.
+    """
+    try:
+        fields = selected_fields(request, DETAIL_FIELDS)
+    except BadRequest as exception:
+        return error(str(exception), 400)
+    # One row per choice, or a single row without choice, joined in SQL.
+    rows = list(Question.objects.filter(pk=pk).order_by('choice__id').values(
+        'question_text', 'pub_date', 'end_date', 'choice__id',
+        'choice__choice_text', 'choice__vote_count'))
+    if not rows:
+        return error(f"Poll {pk} not found.", 404)
+    question = Question(pk=pk, question_text=rows[0]['question_text'],
+                        pub_date=rows[0]['pub_date'],
+                        end_date=rows[0]['end_date'])
+    if not question.is_published():
+        return error(f"Poll {pk}'s result is not available.", 404)
+    results = question._summarize_results([
+        {'id': row['choice__id'], 'choice_text': row['choice__choice_text'],
+         'votes': row['choice__vote_count']}
+        for row in rows if row['choice__id'] is not None])
+    item = {'id': question.id,
+            'question_text': question.question_text,
+            'pub_date': question.pub_date,
+            'end_date': question.end_date,
+            'is_open': question.can_vote(),
+            'total_votes': results['total_votes'],
+            'choices': results['choices']}
+    return conditional_json(request, {field: item[field] for field in fields})
+
+
+@require_POST
+def vote(request, pk):
+    """
+    vote() casts the vote of the logged in user for a choice of a question
+    open for voting.
+    """
+    if not request.user.is_authenticated:
+        return error('Authentication credentials were not provided.', 401)
+    if request.content_type == 'application/json':
+        try:
+            choice_id = json.loads(request.body or b'{}').get('choice')
+        except (ValueError, AttributeError):
+            return error('The body is not a JSON object.', 400)
+    else:
+        choice_id = request.POST.get('choice')
+    try:
+        choice = Choice.objects.select_related('question').get(
+            pk=int(choice_id), question_id=pk)
+    except (TypeError, ValueError, Choice.DoesNotExist):
+        if not Question.objects.filter(pk=pk).exists():
+            return error(f"Poll {pk} not found.", 404)
+        return error("You didn't select a valid choice.", 400)
+    question = choice.question
+    if not question.can_vote():
+        return error(f"Poll {pk} is not available for voting.", 403)
+    ip_address = client_address(request)
+    queued = record_vote(request.user, question, choice, ip_address)
+    event = 'vote.queued' if queued else 'vote.cast'
+    getLogger('polls').info('%s voted for %s in %s from %s (API)',
+                            request.user, choice, question, ip_address,
+                            extra=vote_fields(event, request.user, question,
+                                              ip_address, choice))
+    return JsonResponse({'question': question.id, 'choice': choice.id,
+                         'queued': queued})
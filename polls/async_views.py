@@ -0,0 +1,210 @@
+"""
+Asynchronous versions of the polls views, for ASGI servers.
+
+They behave like the views of polls.views but query the database with
+the async ORM, so a request waiting on the database does not hold a
+thread of the server. settings.POLLS_ASYNC_VIEWS routes the polls URLs
+to them (see polls/async_urls.py).
+"""
+from functools import wraps
+from logging import getLogger
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import SynchronousOnlyOperation
+from django.http import Http404, HttpResponseRedirect
+from django.shortcuts import redirect, render
+from django.urls import reverse
+from django.utils import timezone
+from django.views import generic
+
+from .caching import index_version
+from .live import astream_results, get_live_results
+from .log import vote_fields
+from .models import Choice, Question
+from .pagination import KeysetPage
+from .ratelimit import client_address
+from .views import event_stream_response, find_previous_vote, record_vote
+
+
+async def aget_user(request):
+    """
+    Return the user of a request, loading the lazy user (and the session
+    it is read from) in a worker thread.
+    """
+    def load_user():
+        request.user.is_authenticated
+        return request.user
+    return await sync_to_async(load_user)()
+
+
+def async_login_required(view):
+    """
+    The async counterpart of login_required: redirect anonymous users to
+    the login page.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+class IndexView(generic.View):
+    """
+    IndexView displays a page of published questions, newest first.
+    """
+    template_name = 'polls/index.html'
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Render the page of published questions after the 'after' cursor.
+        The page is only queried when its fragment is not cached.
+        """
+        await aget_user(request)
+        now = timezone.now()
+        questions = Question.objects.published(now).with_open_state(now)
+        page = KeysetPage(questions, request.GET.get('after'),
+                          settings.POLLS_INDEX_PAGE_SIZE)
+        version = index_version()
+        fragment_key = make_template_fragment_key('polls_index',
+                                                  [version, page.cursor])
+        if not await cache.ahas_key(fragment_key):
+            await page.aload()
+        context = {'latest_question_list': page,
+                   'index_version': version,
+                   'index_cache_timeout': settings.POLLS_INDEX_CACHE_TIMEOUT}
+        try:
+            return render(request, self.template_name, context)
+        except SynchronousOnlyOperation:
+            # The fragment expired between the check and the render.
+            await page.aload()
+            return render(request, self.template_name, context)
+
+
+class DetailView(generic.View):
+    """
+    DetailView displays the details of a poll question,
+    including question text, and its choices.
+    """
+    template_name = 'polls/detail.html'
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Render the detail page of a question open for voting, or redirect
+        to the poll index page with an error message.
+        """
+        user = await aget_user(request)
+        question = await Question.objects.filter(pk=kwargs['pk']).afirst()
+        if question is None:
+            messages.error(request, message=f"Poll {kwargs['pk']} not found.")
+            return redirect('polls:index')
+        if question.can_vote():
+            choices = [choice async for choice in question.choice_set.all()]
+            previous_vote = await sync_to_async(find_previous_vote)(
+                user, question.id)
+            return render(request, self.template_name,
+                          {'question': question, 'choices': choices,
+                           'previous_vote': previous_vote})
+        messages.error(request,
+                       message=f"Poll {kwargs['pk']} is not available "
+                               f"for voting.")
+        return redirect('polls:index')
+
+
+class ResultsView(generic.View):
+    """
+    ResultsView displays the results of a poll question.
+    """
+    template_name = 'polls/results.html'
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Render the results of a published question, or redirect to the
+        poll index page with an error message.
+        """
+        await aget_user(request)
+        question = await Question.objects.filter(pk=kwargs['pk']).afirst()
+        if question is None:
+            messages.error(request, message=f"Poll {kwargs['pk']} not found.")
+            return redirect('polls:index')
+        if question.is_published():
+            return render(request, self.template_name,
+                          {'question': question,
+                           'results': await question.aget_results(),
+                           'live_results': True})
+        messages.error(request,
+                       message=f"Poll {kwargs['pk']}'s result is not "
+                               f"available.")
+        return redirect('polls:index')
+
+
+async def results_stream(request, pk):
+    """
+    results_stream() pushes the results of a poll question as
+    Server-Sent Events whenever votes change them, at most once per
+    settings.POLLS_LIVE_RESULTS_INTERVAL.
+    """
+    question = await Question.objects.filter(pk=pk).afirst()
+    if question is None or not question.is_published():
+        raise Http404(f"Poll {pk}'s result is not available.")
+    events = astream_results(get_live_results(), question,
+                             settings.POLLS_LIVE_RESULTS_TIMEOUT)
+    return event_stream_response(events)
+
+
+@async_login_required
+async def vote(request, question_id):
+    """
+    vote() is responsible for handling user votes on a poll question.
+    """
+    try:
+        question = await Question.objects.aget(pk=question_id)
+    except Question.DoesNotExist:
+        raise Http404('No Question matches the given query.')
+    requested_user = request.user
+    ip_address = client_address(request)
+    logger = getLogger('polls')
+    logger.info('%s logged in from %s', requested_user, ip_address,
+                extra=vote_fields('vote.login', requested_user, question,
+                                  ip_address))
+
+    if not question.can_vote():
+        messages.error(request, message=f"Poll {question_id} is not available "
+                                        f"for voting.")
+        return redirect('polls:index')
+    try:
+        selected_choice = await question.choice_set.aget(
+            pk=request.POST['choice'])
+    except (KeyError, Choice.DoesNotExist):
+        previous_url = request.META.get('HTTP_REFERER')
+        if 'login' not in str(previous_url):
+            logger.warning('%s failed to vote %s from %s', requested_user,
+                           question, ip_address,
+                           extra=vote_fields('vote.failed', requested_user,
+                                             question, ip_address))
+            messages.error(request, message="You didn't select a choice.")
+        return HttpResponseRedirect(reverse('polls:detail', args=(question.id,
+                                                                  )))
+
+    # Votes are written in a transaction, which the async ORM cannot run.
+    if await sync_to_async(record_vote)(requested_user, question,
+                                        selected_choice, ip_address):
+        logger.info('%s queued a vote for %s in %s from %s', requested_user,
+                    selected_choice, question, ip_address,
+                    extra=vote_fields('vote.queued', requested_user,
+                                      question, ip_address, selected_choice))
+    else:
+        logger.info('%s voted for %s in %s from %s', requested_user,
+                    selected_choice, question, ip_address,
+                    extra=vote_fields('vote.cast', requested_user, question,
+                                      ip_address, selected_choice))
+    messages.info(request, message=f"You voted for \"{selected_choice}\".")
+    return HttpResponseRedirect(reverse('polls:results', args=(question.id,
+                                                               )))
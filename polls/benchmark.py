@@ -0,0 +1,343 @@
+"""
+Benchmark of the polls request paths.
+
+seed() fills the database with a synthetic, reproducible dataset and
+run() drives the index, detail, vote and results views through the test
+client, reporting latency percentiles, throughput and query counts per
+view. The views are driven either through the WSGI handler with the sync
+views, one thread per client, or through the ASGI handler with the async
+views, one coroutine per client. The polls_benchmark management command
+runs it against a throwaway test database and compares the report with a
+JSON baseline. render_templates() times the rendering of the poll
+pages alone, for growing numbers of questions and choices.
+"""
+import asyncio
+import random
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.db import connection
+from django.template import loader
+from django.test import AsyncClient, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Choice, Question, Vote
+from .pagination import KeysetPage
+
+BATCH_SIZE = 1000
+
+SCENARIOS = ['index', 'detail', 'vote', 'results']
+
+INTERFACES = ['wsgi', 'asgi']
+
+# The URLconf routing the polls pages to the async views.
+ASYNC_URLCONF = 'mysite.async_urls'
+
+RENDER_VIEWS = ['index', 'detail', 'results']
+
+# Questions per index page, or choices per question, rendered.
+RENDER_SIZES = [10, 100, 1000]
+
+
+def seed(questions=50, choices=4, users=100, votes=1000, random_seed=0):
+    """
+    Create a synthetic dataset of open questions, their choices, users
+    and votes. The same arguments always produce the same dataset.
+
+    :return: A dict with the ids of the questions, the ids of the choices
+             of each question and the ids of the users.
+    """
+    rng = random.Random(random_seed)
+    question_objects = Question.objects.bulk_create(
+        [Question(question_text=f'Benchmark question {count}?')
+         for count in range(questions)], batch_size=BATCH_SIZE)
+    choice_objects = Choice.objects.bulk_create(
+        [Choice(question=question, choice_text=f'Choice {count}')
+         for question in question_objects for count in range(choices)],
+        batch_size=BATCH_SIZE)
+    password = make_password('benchmark')
+    user_objects = User.objects.bulk_create(
+        [User(username=f'benchmark{count}', password=password)
+         for count in range(users)], batch_size=BATCH_SIZE)
+    question_choices = {}
+    for choice in choice_objects:
+        question_choices.setdefault(choice.question_id, []).append(choice.pk)
+    pairs = rng.sample(range(questions * users),
+                       min(votes, questions * users))
+    vote_objects = []
+    for pair in pairs:
+        question = question_objects[pair % questions]
+        vote_objects.append(Vote(
+            user=user_objects[pair // questions], question=question,
+            choice_id=rng.choice(question_choices[question.pk])))
+    Vote.objects.bulk_create(vote_objects, batch_size=BATCH_SIZE)
+    Choice.objects.recount_votes()
+    return {'questions': [question.pk for question in question_objects],
+            'choices': question_choices,
+            'users': [user.pk for user in user_objects]}
+
+
+def percentile(samples, fraction):
+    """Return the given fraction (0 to 1) percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, round(fraction * (len(samples) - 1)))
+    return samples[index]
+
+
+def _request(client, scenario, dataset, rng):
+    """Send one request of a scenario with the given client."""
+    question_id = rng.choice(dataset['questions'])
+    if scenario == 'index':
+        return client.get(reverse('polls:index'))
+    if scenario == 'detail':
+        return client.get(reverse('polls:detail', args=(question_id,)))
+    if scenario == 'vote':
+        return client.post(reverse('polls:vote', args=(question_id,)),
+                           {'choice': rng.choice(
+                               dataset['choices'][question_id])})
+    return client.get(reverse('polls:results', args=(question_id,)))
+
+
+def _client(scenario, dataset, rng, interface='wsgi'):
+    """
+    Return a test client of an interface for a scenario, logged in as a
+    random user for the detail and vote views.
+    """
+    client = AsyncClient() if interface == 'asgi' else Client()
+    if scenario in ('detail', 'vote'):
+        client.force_login(User.objects.get(pk=rng.choice(dataset['users'])))
+    return client
+
+
+def _session_queries(captured_queries):
+    """
+    Return the number of reads and the number of writes of the session
+    table among captured queries.
+    """
+    reads = writes = 0
+    for query in captured_queries:
+        if 'django_session' in query['sql']:
+            if query['sql'].lstrip().upper().startswith('SELECT'):
+                reads += 1
+            else:
+                writes += 1
+    return reads, writes
+
+
+def _worker(client, scenario, dataset, requests, rng, samples):
+    """
+    Send requests of a scenario from one client, appending a
+    (latency, queries, ok, session reads, session writes) sample per
+    request.
+    """
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                response = _request(client, scenario, dataset, rng)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            latency = time.perf_counter() - started
+        samples.append((latency, len(queries), ok,
+                        *_session_queries(queries.captured_queries)))
+
+
+async def _async_worker(client, scenario, dataset, requests, rng, samples):
+    """
+    Send requests of a scenario from one async client, appending a
+    (latency, queries, ok, session reads, session writes) sample per
+    request. The queries of the async views run in worker threads and are
+    not counted.
+    """
+    for _ in range(requests):
+        started = time.perf_counter()
+        try:
+            response = await _request(client, scenario, dataset, rng)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        samples.append((time.perf_counter() - started, None, ok, None, None))
+
+
+def _threaded_worker(*args):
+    """Run a worker and close the database connection of its thread."""
+    try:
+        _worker(*args)
+    finally:
+        connection.close()
+
+
+def run_scenario(scenario, dataset, requests=200, concurrency=1,
+                 random_seed=0, interface='wsgi'):
+    """
+    Drive one view with the given number of requests spread over
+    'concurrency' clients. WSGI clients run each in its own thread (or
+    in the current thread when concurrency is 1), ASGI clients run as
+    coroutines of one event loop.
+
+    :return: A dict of the latency percentiles in milliseconds, the
+             throughput in requests per second, the mean count of queries
+             and of reads and writes of the session table (None for ASGI)
+             and the number of failed requests.
+    """
+    samples = []
+    shares = [requests // concurrency + (count < requests % concurrency)
+              for count in range(concurrency)]
+    rngs = [random.Random(random_seed + count) for count in range(concurrency)]
+    # Clients log in before the clock starts, one at a time.
+    clients = [_client(scenario, dataset, rng, interface) for rng in rngs]
+    started = time.perf_counter()
+    if interface == 'asgi':
+        async def run_clients():
+            await asyncio.gather(*[
+                _async_worker(client, scenario, dataset, share, rng, samples)
+                for client, share, rng in zip(clients, shares, rngs)])
+        # The sync parts of the async views run in the calling thread,
+        # on its database connection.
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            async_to_sync(run_clients)()
+    elif concurrency == 1:
+        _worker(clients[0], scenario, dataset, requests, rngs[0], samples)
+    else:
+        threads = [threading.Thread(
+            target=_threaded_worker,
+            args=(client, scenario, dataset, share, rng, samples))
+            for client, share, rng in zip(clients, shares, rngs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+
+    def mean(position):
+        """The mean of a count of the samples, None if not counted."""
+        if interface != 'wsgi':
+            return None
+        return round(sum(sample[position] for sample in samples)
+                     / max(len(samples), 1), 2)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample[2]),
+        'throughput': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'queries': mean(1),
+        'session_reads': mean(3),
+        'session_writes': mean(4),
+    }
+
+
+def run(dataset, scenarios=SCENARIOS, requests=200, concurrency=1,
+        random_seed=0, interfaces=('wsgi',)):
+    """
+    Run each scenario through each interface against a seeded dataset,
+    starting from empty caches. Rate limits are lifted, as every client
+    of the benchmark votes from the same address.
+
+    :return: A dict mapping scenario names to their results. The results
+             of the ASGI interface are keyed 'asgi:<scenario>'.
+    """
+    report = {}
+    with override_settings(POLLS_RATE_LIMITS={}):
+        for interface in interfaces:
+            for scenario in scenarios:
+                for alias in ('default', 'votes'):
+                    caches[alias].clear()
+                key = (scenario if interface == 'wsgi'
+                       else f'{interface}:{scenario}')
+                report[key] = run_scenario(scenario, dataset, requests,
+                                           concurrency, random_seed,
+                                           interface)
+    return report
+
+
+def compare(report, baseline, tolerance=0.25):
+    """
+    Compare a report with a baseline report.
+
+    :return: A list of regressions, each a message naming the scenario
+             and metric that got worse: more queries per request at all,
+             or a p95 latency slower by more than 'tolerance' (a fraction).
+    """
+    regressions = []
+    for scenario, expected in baseline.items():
+        actual = report.get(scenario)
+        if actual is None:
+            continue
+        if None not in (actual['queries'], expected['queries']) \
+                and actual['queries'] > expected['queries']:
+            regressions.append(f"{scenario}: {actual['queries']} queries per "
+                               f"request, baseline {expected['queries']}")
+        if actual['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{scenario}: p95 {actual['p95_ms']} ms, "
+                               f"baseline {expected['p95_ms']} ms")
+    return regressions
+
+
+def _render_context(view, size):
+    """
+    Return the template name and the context of a poll page showing
+    'size' questions or choices, built from unsaved objects.
+    """
+    now = timezone.now()
+    if view == 'index':
+        questions = []
+        for pk in range(size, 0, -1):
+            question = Question(pk=pk, question_text=f'Question {pk}?',
+                                pub_date=now)
+            question.is_open = bool(pk % 2)
+            questions.append(question)
+        page = KeysetPage(Question.objects.none(), None, size)
+        page.set_rows(questions)
+        # A zero timeout renders the cached fragment every time.
+        return 'polls/index.html', {'latest_question_list': page,
+                                    'index_version': 'benchmark',
+                                    'index_cache_timeout': 0}
+    question = Question(pk=1, question_text='Question?', pub_date=now)
+    choices = [Choice(pk=pk, question=question, choice_text=f'Choice {pk}',
+                      vote_count=pk) for pk in range(1, size + 1)]
+    if view == 'detail':
+        return 'polls/detail.html', {'question': question,
+                                     'choices': choices, 'previous_vote': 1}
+    results = question._summarize_results([
+        {'id': choice.pk, 'choice_text': choice.choice_text,
+         'votes': choice.vote_count} for choice in choices])
+    return 'polls/results.html', {'question': question, 'results': results}
+
+
+def render_templates(views=RENDER_VIEWS, sizes=RENDER_SIZES, repeat=20):
+    """
+    Render the template of each poll page 'repeat' times for each size,
+    through the configured template loaders and without the database.
+
+    :return: A dict mapping '<view>:<size>' to the mean and p95 render
+             time in milliseconds.
+    """
+    request = RequestFactory().get('/polls/')
+    request.user = AnonymousUser()
+    report = {}
+    for view in views:
+        for size in sizes:
+            name, context = _render_context(view, size)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                loader.get_template(name).render(context, request)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            report[f'{view}:{size}'] = {
+                'renders': repeat,
+                'mean_ms': round(sum(timings) / repeat, 3),
+                'p95_ms': round(percentile(timings, 0.95), 3),
+            }
+    return report
@@ -0,0 +1,217 @@
+"""
+Cache helpers of the polls app.
+"""
+import hashlib
+import time
+from functools import wraps
+from uuid import uuid4
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import Vote
+
+INDEX_VERSION_KEY = 'polls:index:version'
+
+# The scope of the modification time of every page.
+ALL_PAGES = 'all'
+
+
+def index_version():
+    """
+    Return the token identifying the current state of the poll list.
+    Cached fragments of the index page are keyed on it.
+    """
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(INDEX_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+
+def invalidate_index():
+    """Replace the index version, so cached index fragments are skipped."""
+    cache.set(INDEX_VERSION_KEY, uuid4().hex, None)
+
+
+def _previous_vote_key(user_id, question_id):
+    """Return the cache key of the vote of a user for a question."""
+    return f'polls:vote:{user_id}:{question_id}'
+
+
+def get_previous_vote(user, question_id):
+    """
+    Return the choice id of the vote of a user for a question, or 0 if
+    the user has not voted for it (or is not logged in). The answer is
+    read from the 'votes' cache, and from the Vote table on a miss.
+    """
+    if not user.is_authenticated:
+        return 0
+    key = _previous_vote_key(user.id, question_id)
+    choice_id = caches['votes'].get(key)
+    if choice_id is None:
+        choice_id = Vote.objects.filter(
+            user=user, question_id=question_id
+        ).values_list('choice_id', flat=True).first() or 0
+        caches['votes'].set(key, choice_id)
+    return choice_id
+
+
+def remember_votes(votes):
+    """
+    Write votes through to the 'votes' cache.
+
+    :param votes: A dict mapping (user id, question id) to choice ids.
+    """
+    caches['votes'].set_many({
+        _previous_vote_key(user_id, question_id): choice_id
+        for (user_id, question_id), choice_id in votes.items()
+    })
+
+
+def forget_vote(user_id, question_id):
+    """Drop the cached vote of a user for a question."""
+    caches['votes'].delete(_previous_vote_key(user_id, question_id))
+
+
+def forget_votes(keys):
+    """
+    Drop the cached votes of the given (user id, question id) pairs, after
+    votes are changed in bulk.
+    """
+    caches['votes'].delete_many([_previous_vote_key(user_id, question_id)
+                                 for user_id, question_id in keys])
+
+
+def _modified_key(scope):
+    """Return the cache key of the modification time of a page scope."""
+    return f'polls:modified:{scope}'
+
+
+def touch_pages(scopes):
+    """
+    Record that the pages of the given scopes ('index', 'results:<pk>' or
+    ALL_PAGES) changed now, so their cached copies are skipped.
+    """
+    now = time.time()
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def page_modified(scope):
+    """
+    Return the time (a timestamp) the pages of a scope last changed. A
+    scope with no recorded change is taken to change now.
+    """
+    keys = [_modified_key(scope), _modified_key(ALL_PAGES)]
+    times = cache.get_many(keys)
+    if keys[0] not in times:
+        cache.add(keys[0], time.time(), None)
+        times[keys[0]] = cache.get(keys[0])
+    return max(times.values())
+
+
+def is_anonymous(request):
+    """
+    Whether a request comes from an anonymous visitor with no pending
+    flash messages, told from its cookies without loading the session.
+    """
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES \
+        and CookieStorage.cookie_name not in request.COOKIES
+
+
+def cache_anonymous_page(scope):
+    """
+    Cache the pages of a view for anonymous visitors, and answer their
+    conditional GET requests with 304 Not Modified.
+
+    The pages are validated by an ETag and a Last-Modified time taken from
+    the modification time of their scope, a format string of the URL
+    arguments such as 'results:{pk}'. Pages also depend on the time (polls
+    open and close), so they are revalidated at least every
+    settings.POLLS_PAGE_CACHE_TIMEOUT seconds. Pages of authenticated
+    users, with their name and previous votes, are never cached.
+    """
+    def validators(request, kwargs):
+        """Return the Last-Modified timestamp and ETag of a page."""
+        timeout = settings.POLLS_PAGE_CACHE_TIMEOUT
+        modified = page_modified(scope.format(**kwargs))
+        last_modified = int(max(modified, time.time() // timeout * timeout))
+        digest = hashlib.md5(f'{request.get_full_path()}|{modified}|'
+                             f'{last_modified}'.encode(),
+                             usedforsecurity=False).hexdigest()
+        return last_modified, f'"{digest}"'
+
+    def is_cacheable(request):
+        return settings.POLLS_PAGE_CACHE_TIMEOUT > 0 \
+            and request.method in ('GET', 'HEAD') and is_anonymous(request)
+
+    def finish(response, last_modified, etag):
+        """Add the validators and caching headers to a response."""
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'max-age=0, must-revalidate'
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+    def store(key, response):
+        """Return the content of a response to cache, if it can be."""
+        if hasattr(response, 'render'):
+            # A TemplateResponse, rendered now to cache its content.
+            response.render()
+        if response.status_code == 200 and not response.streaming \
+                and not response.cookies:
+            return key, (response.content, response['Content-Type'])
+        return None
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not is_cacheable(request):
+                    return await view(request, *args, **kwargs)
+                last_modified, etag = validators(request, kwargs)
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=last_modified)
+                if response is not None:
+                    return finish(response, last_modified, etag)
+                key = f'polls:page:{etag}'
+                cached = await cache.aget(key)
+                if cached is not None:
+                    response = HttpResponse(cached[0],
+                                            content_type=cached[1])
+                else:
+                    response = await view(request, *args, **kwargs)
+                    entry = store(key, response)
+                    if entry is None:
+                        return response
+                    await cache.aset(*entry, settings.POLLS_PAGE_CACHE_TIMEOUT)
+                return finish(response, last_modified, etag)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view(request, *args, **kwargs)
+            last_modified, etag = validators(request, kwargs)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return finish(response, last_modified, etag)
+            key = f'polls:page:{etag}'
+            cached = cache.get(key)
+            if cached is not None:
+                response = HttpResponse(cached[0], content_type=cached[1])
+            else:
+                response = view(request, *args, **kwargs)
+                entry = store(key, response)
+                if entry is None:
+                    return response
+                cache.set(*entry, settings.POLLS_PAGE_CACHE_TIMEOUT)
+            return finish(response, last_modified, etag)
+        return wrapper
+    return decorator
@@ -0,0 +1,72 @@
+"""
+Streaming exports of poll results and votes.
+
+Exports are produced line by line from generators, and raw votes are
+read with a chunked iterator, so memory stays flat whatever the size of
+the poll.
+"""
+import csv
+import json
+
+from .models import Vote
+
+TALLY_FIELDS = ['choice_id', 'choice_text', 'votes']
+
+VOTE_FIELDS = ['vote_id', 'user_id', 'username', 'choice_id']
+
+
+def tally_records(question):
+    """Yield the vote total of each choice of a question."""
+    for choice in question.get_results()['choices']:
+        yield {'choice_id': choice['id'], 'choice_text': choice['choice_text'],
+               'votes': choice['votes']}
+
+
+def vote_records(question, chunk_size):
+    """
+    Yield every vote of a question, reading the votes in chunks of
+    chunk_size rows.
+    """
+    rows = Vote.objects.filter(question=question).order_by('pk').values_list(
+        'pk', 'user_id', 'user__username', 'choice_id'
+    ).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield dict(zip(VOTE_FIELDS, row))
+
+
+class _Echo:
+    """A file-like object whose write() returns what it is given."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(fields, records):
+    """Yield the lines of a CSV file with a header row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for record in records:
+        yield writer.writerow([record[field] for field in fields])
+
+
+def render_jsonl(fields, records):
+    """Yield the lines of a JSON Lines file."""
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+FORMATS = {
+    'csv': (render_csv, 'text/csv'),
+    'jsonl': (render_jsonl, 'application/x-ndjson'),
+}
+
+
+def export_lines(question, export_format, votes=False, chunk_size=2000):
+    """
+    Yield the lines of an export of a question, either its per-choice
+    tallies or, if votes is True, its raw votes.
+    """
+    render = FORMATS[export_format][0]
+    if votes:
+        return render(VOTE_FIELDS, vote_records(question, chunk_size))
+    return render(TALLY_FIELDS, tally_records(question))
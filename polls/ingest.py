@@ -0,0 +1,364 @@
+"""
+Write-behind ingestion of votes.
+
+When settings.POLLS_VOTE_INGESTION is 'queued', vote() hands votes to a
+VoteQueue instead of writing them to the database. Each vote is first
+appended to an on-disk journal, then kept in memory until a background
+worker flushes the pending votes, and the events of every vote submitted,
+in one batched transaction.
+
+Each process has its own journal, settings.POLLS_VOTE_JOURNAL suffixed
+with its process id, which it holds a lock on while it runs. A starting
+process recovers the journals left unlocked by processes that stopped
+before flushing them.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import suppress
+from collections import defaultdict
+from datetime import datetime, timezone
+from logging import getLogger
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+
+from .caching import remember_votes, touch_pages
+from .live import get_live_results
+from .models import Choice, Vote, VoteEvent, valid_ip
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+logger = getLogger('polls')
+
+
+def lock_journal(journal_path):
+    """
+    Take the lock of a journal without waiting, through a lock file next
+    to it. The lock is released when the returned file is closed, or when
+    its process ends.
+
+    :return: The open lock file, or None if another process holds the
+             lock.
+    """
+    lock = open(f'{journal_path}.lock', 'a+')
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock.close()
+        return None
+    return lock
+
+
+def build_events(events, existing, live_users, live_choices):
+    """
+    Build the VoteEvent of each submitted vote of a batch, in order, with
+    the choice each one switched from.
+
+    :param existing: The votes in the database before the batch, as a
+                     dict mapping (user id, question id) to choice ids.
+    """
+    current = dict(existing)
+    vote_events = []
+    for user_id, question_id, choice_id, created, ip_address in events:
+        if user_id not in live_users or choice_id not in live_choices:
+            continue
+        key = (user_id, question_id)
+        vote_events.append(VoteEvent(
+            created=datetime.fromtimestamp(created, timezone.utc),
+            user_id=user_id, question_id=question_id, choice_id=choice_id,
+            previous_choice_id=current.get(key), ip=valid_ip(ip_address)))
+        current[key] = choice_id
+    return vote_events
+
+
+class VoteQueue:
+    """
+    VoteQueue buffers votes keyed by (user id, question id) and writes
+    them to the database in batches. Only the latest vote of a user for
+    a question is kept, so a burst of switches costs a single write.
+
+    The queue journals into 'journal_path', which no other queue may use
+    at the same time. With 'shared_path', the journals named after it
+    (shared_path.<pid>) that no running queue holds are recovered too.
+    """
+
+    def __init__(self, journal_path, batch_size=500, flush_interval=1.0,
+                 fsync=True, shared_path=None):
+        self.journal_path = str(journal_path)
+        self.flushing_path = f'{self.journal_path}.flushing'
+        self.shared_path = shared_path and str(shared_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._pending = {}
+        self._events = []
+        self._inflight = {}
+        self._thread = None
+        self._journal_lock = lock_journal(self.journal_path)
+        if self._journal_lock is None:
+            raise RuntimeError(f'The vote journal {self.journal_path} is '
+                               f'used by another process.')
+        self._recover()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _orphaned_journals(self):
+        """
+        Return the journals named after the shared path, other than the
+        journal of this queue, with the locks taken from the stopped
+        processes that left them.
+        """
+        if self.shared_path is None:
+            return []
+        # A journal of the shared path itself is left by older versions.
+        paths = [self.shared_path] + [
+            path for path in glob.glob(f'{glob.escape(self.shared_path)}.*')
+            if path[len(self.shared_path) + 1:].isdigit()]
+        orphans = []
+        for path in paths:
+            if path == self.journal_path or not (
+                    os.path.exists(path)
+                    or os.path.exists(f'{path}.flushing')):
+                continue
+            lock = lock_journal(path)
+            if lock is not None:
+                orphans.append((path, lock))
+        return orphans
+
+    def _recover(self):
+        """
+        Load the votes left in the journal of this queue, and in the
+        orphaned journals of other processes, by processes that stopped
+        before flushing them, and move them to the journal of this queue.
+        """
+        orphans = self._orphaned_journals()
+        journals = [self.journal_path] + [path for path, _ in orphans]
+        for path in (f'{journal}{suffix}' for journal in journals
+                     for suffix in ('.flushing', '')):
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        event = json.loads(line)
+                        user_id, question_id, choice_id = event[:3]
+                    except ValueError:
+                        # A torn last line from a crash mid-write.
+                        continue
+                    # Lines of older journals have no time and IP address.
+                    created, ip_address = (event[3:] + [None, None])[:2]
+                    self._pending[(user_id, question_id)] = choice_id
+                    self._events.append([user_id, question_id, choice_id,
+                                         created or time.time(), ip_address])
+        if orphans or os.path.exists(self.flushing_path):
+            self._rewrite_journal(self._events)
+            with suppress(FileNotFoundError):
+                os.remove(self.flushing_path)
+        for path, lock in orphans:
+            for orphan_path in (f'{path}.flushing', path):
+                with suppress(FileNotFoundError):
+                    os.remove(orphan_path)
+            lock.close()
+            with suppress(FileNotFoundError):
+                os.remove(f'{path}.lock')
+        if self._pending:
+            logger.info('Recovered %s pending vote(s) into %s',
+                        len(self._pending), self.journal_path)
+
+    def _rewrite_journal(self, events):
+        """Atomically replace the journal with the given vote events."""
+        temporary_path = f'{self.journal_path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as journal:
+            for event in events:
+                journal.write(json.dumps(event) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temporary_path, self.journal_path)
+
+    def submit(self, user_id, question_id, choice_id, ip_address=None):
+        """
+        Record a vote in the journal and queue it for the next flush.
+        """
+        event = [user_id, question_id, choice_id, time.time(), ip_address]
+        with self._lock:
+            self._journal.write(json.dumps(event) + '\n')
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._pending[(user_id, question_id)] = choice_id
+            self._events.append(event)
+            if len(self._events) >= self.batch_size:
+                self._wakeup.set()
+
+    def pending_choice(self, user_id, question_id):
+        """
+        Return the choice id of a vote that is queued but not yet written
+        to the database, or None if there is no such vote.
+        """
+        with self._lock:
+            key = (user_id, question_id)
+            return self._pending.get(key, self._inflight.get(key))
+
+    def flush(self):
+        """
+        Write all pending votes to the database in one transaction.
+
+        :return: The number of votes written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                events, self._events = self._events, []
+                self._inflight = batch
+                self._journal.close()
+                os.replace(self.journal_path, self.flushing_path)
+                self._journal = open(self.journal_path, 'a',
+                                     encoding='utf-8')
+            try:
+                written = self._write(batch, events)
+            except Exception:
+                logger.exception('Failed to flush %s vote(s)', len(batch))
+                with self._lock:
+                    self._pending = {**batch, **self._pending}
+                    self._events = events + self._events
+                    self._inflight = {}
+                    self._journal.close()
+                    self._rewrite_journal(self._events)
+                    self._journal = open(self.journal_path, 'a',
+                                         encoding='utf-8')
+                    os.remove(self.flushing_path)
+                raise
+            with self._lock:
+                self._inflight = {}
+                os.remove(self.flushing_path)
+            return written
+
+    @staticmethod
+    def _write(batch, events):
+        """
+        Insert or switch the votes of a batch with one bulk upsert, adjust
+        the vote counters of the affected choices and append the events of
+        the batch to the event log.
+        """
+        user_ids = {user_id for user_id, _ in batch}
+        question_ids = {question_id for _, question_id in batch}
+        with transaction.atomic():
+            # Votes of users or choices deleted since they were queued
+            # are dropped. The users are locked, in order, like in
+            # Vote.objects.cast(), so a first vote cast meanwhile by another
+            # process is read below rather than counted twice.
+            live_users = set(User.objects.select_for_update().filter(
+                pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+            live_choices = set(Choice.objects.filter(
+                pk__in={event[2] for event in events}
+            ).values_list('pk', flat=True))
+            existing = {
+                (user_id, question_id): choice_id
+                for user_id, question_id, choice_id
+                in Vote.objects.select_for_update().filter(
+                    user_id__in=user_ids, question_id__in=question_ids
+                ).values_list('user_id', 'question_id', 'choice_id')
+            }
+            votes = []
+            amounts = defaultdict(int)
+            for (user_id, question_id), choice_id in batch.items():
+                if user_id not in live_users or choice_id not in live_choices:
+                    continue
+                previous_choice_id = existing.get((user_id, question_id))
+                if previous_choice_id == choice_id:
+                    continue
+                if previous_choice_id is not None:
+                    amounts[previous_choice_id] -= 1
+                amounts[choice_id] += 1
+                votes.append(Vote(user_id=user_id, question_id=question_id,
+                                  choice_id=choice_id))
+            Vote.objects.upsert(votes)
+            Choice.objects.add_votes(amounts)
+            VoteEvent.objects.bulk_create(
+                build_events(events, existing, live_users, live_choices))
+        remember_votes({(vote.user_id, vote.question_id): vote.choice_id
+                        for vote in votes})
+        question_ids = {vote.question_id for vote in votes}
+        get_live_results().mark_changed(question_ids)
+        touch_pages([f'results:{question_id}' for question_id in question_ids])
+        return len(votes)
+
+    def start(self):
+        """Start the background worker that flushes the queue."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='vote-queue', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """Flush the queue every flush interval or when a batch fills up."""
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Already logged, the votes stay queued for the next flush.
+                pass
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        """
+        Stop the background worker, flush the remaining votes and remove
+        the emptied journal.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._lock:
+            self._journal.close()
+            if not self._events:
+                os.remove(self.journal_path)
+        self._journal_lock.close()
+        with suppress(FileNotFoundError):
+            os.remove(f'{self.journal_path}.lock')
+
+
+_vote_queue = None
+_vote_queue_lock = threading.Lock()
+
+
+def get_vote_queue():
+    """
+    Return the VoteQueue of this process, creating and starting it on
+    first use, with a journal of its own. The queue is flushed when the
+    process exits.
+    """
+    global _vote_queue
+    with _vote_queue_lock:
+        if _vote_queue is None:
+            _vote_queue = VoteQueue(
+                f'{settings.POLLS_VOTE_JOURNAL}.{os.getpid()}',
+                batch_size=settings.POLLS_VOTE_BATCH_SIZE,
+                flush_interval=settings.POLLS_VOTE_FLUSH_INTERVAL,
+                shared_path=settings.POLLS_VOTE_JOURNAL)
+            _vote_queue.start()
+            atexit.register(_vote_queue.stop)
+        return _vote_queue
@@ -0,0 +1,151 @@
+"""
+Live poll results pushed to browsers with Server-Sent Events.
+
+Each question watched by at least one results stream has a channel in
+the LiveResults hub of the process. Votes mark the channel of their
+question as changed, and the first subscriber to poll a changed channel
+once its interval has passed computes a new snapshot of the tallies,
+which every other subscriber then reads. However many clients watch a
+question, its tallies are aggregated at most once per interval.
+
+Streams are only served by the async views: under WSGI each open stream
+would hold a worker for its whole timeout.
+"""
+import asyncio
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+# Channels are also refreshed after this many intervals without a change,
+# to pick up votes recorded by other processes.
+STALE_INTERVALS = 15
+
+# Seconds between comments sent to keep idle streams open through proxies.
+KEEPALIVE = 15
+
+
+class ResultsChannel:
+    """
+    ResultsChannel holds the latest snapshot of the results of a question
+    and the number of streams subscribed to it.
+    """
+
+    def __init__(self, question):
+        self.question = question
+        self.subscribers = 0
+        self.changed = True
+        self.computed_at = float('-inf')
+        self.version = 0
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def is_due(self, interval, now):
+        """Whether the snapshot should be recomputed at 'now'."""
+        age = now - self.computed_at
+        return (self.changed and age >= interval) \
+            or age >= interval * STALE_INTERVALS
+
+
+class LiveResults:
+    """
+    LiveResults is the hub of the results channels of a process.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, question):
+        """Subscribe a stream to a question and return its channel."""
+        with self._lock:
+            channel = self._channels.get(question.id)
+            if channel is None:
+                channel = self._channels[question.id] = ResultsChannel(
+                    question)
+            channel.subscribers += 1
+            return channel
+
+    def unsubscribe(self, channel):
+        """Unsubscribe a stream, dropping the channel of its last one."""
+        with self._lock:
+            channel.subscribers -= 1
+            if channel.subscribers == 0:
+                self._channels.pop(channel.question.id, None)
+
+    def mark_changed(self, question_ids):
+        """Mark the results of the given questions as changed."""
+        with self._lock:
+            for question_id in question_ids:
+                channel = self._channels.get(question_id)
+                if channel is not None:
+                    channel.changed = True
+
+    def is_due(self, channel):
+        """Whether the snapshot of a channel should be recomputed now."""
+        return channel.is_due(self.interval, time.monotonic())
+
+    def refresh(self, channel):
+        """
+        Recompute the snapshot of a channel if it is due. Concurrent
+        callers wait for the first one and reuse its snapshot.
+        """
+        with channel.lock:
+            now = time.monotonic()
+            if not channel.is_due(self.interval, now):
+                return
+            channel.changed = False
+            channel.computed_at = now
+            results = channel.question.get_results()
+            if results != channel.snapshot:
+                channel.snapshot = results
+                channel.version += 1
+
+
+def format_event(channel):
+    """Return the latest snapshot of a channel as a Server-Sent Event."""
+    return (f'event: results\nid: {channel.version}\n'
+            f'data: {json.dumps(channel.snapshot)}\n\n')
+
+
+async def astream_results(hub, question, timeout):
+    """
+    Subscribe to the results of a question and yield them as Server-Sent
+    Events for 'timeout' seconds. The browser reconnects when the stream
+    ends.
+    """
+    channel = hub.subscribe(question)
+    deadline = time.monotonic() + timeout
+    seen = 0
+    last_sent = time.monotonic()
+    try:
+        yield f'retry: {int(hub.interval * 1000)}\n\n'
+        while time.monotonic() < deadline:
+            if hub.is_due(channel):
+                await sync_to_async(hub.refresh)(channel)
+            if channel.version != seen:
+                seen = channel.version
+                last_sent = time.monotonic()
+                yield format_event(channel)
+            elif time.monotonic() - last_sent >= KEEPALIVE:
+                last_sent = time.monotonic()
+                yield ': keepalive\n\n'
+            await asyncio.sleep(hub.interval)
+    finally:
+        hub.unsubscribe(channel)
+
+
+_live_results = None
+_live_results_lock = threading.Lock()
+
+
+def get_live_results():
+    """Return the LiveResults hub of this process."""
+    global _live_results
+    with _live_results_lock:
+        if _live_results is None:
+            _live_results = LiveResults(settings.POLLS_LIVE_RESULTS_INTERVAL)
+        return _live_results
@@ -0,0 +1,164 @@
+"""
+Structured, non-blocking logging of the polls app.
+
+QueueLogHandler puts the records of the 'polls' logger on a bounded
+in-memory queue, and a QueueListener thread formats them as JSON lines
+with JsonFormatter and writes them out, so a request never waits on the
+output stream. Records are only formatted by the listener: log messages
+use %-style arguments, which (like the extra fields) must be plain values
+or objects safe to read from another thread. SamplingFilter keeps a
+fraction of routine high-volume events, and records logged while the
+queue is full are dropped. Both are counted per event and exported by
+the metrics view.
+"""
+import json
+import logging
+import queue
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# The structured fields a record may carry in its 'extra'.
+FIELDS = ('event', 'user_id', 'question_id', 'choice_id', 'ip')
+
+
+class LogCounters:
+    """LogCounters counts the records sampled out and dropped by event."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sampled_out = Counter()
+        self.dropped = Counter()
+
+    def count(self, counter, record):
+        """Count a record in the given counter under its event."""
+        with self._lock:
+            counter[getattr(record, 'event', '')] += 1
+
+    def clear(self):
+        """Reset every counter."""
+        with self._lock:
+            self.sampled_out.clear()
+            self.dropped.clear()
+
+    def render(self):
+        """Return the counters in the Prometheus text format."""
+        metrics = {
+            'polls_log_records_sampled_out_total': (
+                'Log records skipped by sampling by event.',
+                self.sampled_out),
+            'polls_log_records_dropped_total': (
+                'Log records dropped on a full log queue by event.',
+                self.dropped),
+        }
+        lines = []
+        with self._lock:
+            for name, (description, counter) in metrics.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} counter')
+                for event, count in sorted(counter.items()):
+                    lines.append(f'{name}{{event="{event}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+counters = LogCounters()
+
+
+def vote_fields(event, user, question, ip_address, choice=None):
+    """Return the structured fields of a record of the vote path."""
+    return {'event': event, 'user_id': user.id, 'question_id': question.id,
+            'choice_id': choice.id if choice is not None else None,
+            'ip': ip_address}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    JsonFormatter formats a record as one JSON object with its time,
+    level, logger, message and structured fields.
+    """
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+                            .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    SamplingFilter keeps the given fraction of the records of each event
+    in 'rates', and every other record. Warnings and errors are always
+    kept.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None), 1.0)
+        if record.levelno >= logging.WARNING or rate >= 1.0 \
+                or random.random() < rate:
+            return True
+        counters.count(counters.sampled_out, record)
+        return False
+
+
+class _Listener(QueueListener):
+    """A QueueListener waiting for room in a full queue to stop."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    QueueLogHandler hands records to a listener thread through a queue of
+    at most 'maxsize' records, which writes them to 'stream' (standard
+    error by default) with the formatter of this handler.
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream)
+        self.listener = _Listener(self.queue, self.target)
+        self.listener.start()
+        self.running = True
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """
+        Leave the formatting of the record to the listener thread. The
+        queue is in-process, so the record needs no pickling.
+        """
+        return record
+
+    def enqueue(self, record):
+        """Queue a record, or drop and count it if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            counters.count(counters.dropped, record)
+
+    def close(self):
+        """Write the queued records and stop the listener thread."""
+        if self.running:
+            self.running = False
+            self.listener.stop()
+        self.target.close()
+        super().close()
@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from polls import benchmark
+
+
+@contextmanager
+def file_test_database(connection):
+    """
+    Keep the SQLite test database of a connection in a temporary file
+    while in the block. The default in-memory test database is shared by
+    the threads of the benchmark through SQLite's shared cache, where
+    concurrent clients fail on table locks.
+    """
+    test_settings = connection.settings_dict['TEST']
+    name = test_settings.get('NAME')
+    if connection.vendor != 'sqlite' or (
+            name and not connection.creation.is_in_memory_db(name)):
+        yield
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        test_settings['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        try:
+            yield
+        finally:
+            test_settings['NAME'] = name
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the polls views against a throwaway test database seeded
+    with a synthetic dataset.
+    """
+    help = ('Seed a synthetic dataset in a test database, drive the polls '
+            'views and report latency, throughput and query counts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=50)
+        parser.add_argument('--choices', type=int, default=4,
+                            help='Choices per question.')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--votes', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per view.')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Clients sending requests in parallel.')
+        parser.add_argument('--scenario', action='append',
+                            choices=benchmark.SCENARIOS,
+                            help='View to benchmark (repeatable, default: '
+                                 'all).')
+        parser.add_argument('--interface', action='append',
+                            choices=benchmark.INTERFACES,
+                            help='Drive the sync views through WSGI or the '
+                                 'async views through ASGI (repeatable to '
+                                 'compare them, default: wsgi).')
+        parser.add_argument('--render', action='store_true',
+                            help='Only time the rendering of the poll '
+                                 'pages with 10, 100 and 1000 questions or '
+                                 'choices.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the dataset and the requests.')
+        parser.add_argument('--output',
+                            help='Write the report to this JSON file, e.g. '
+                                 'to record a new baseline.')
+        parser.add_argument('--baseline',
+                            help='Fail if the report regresses from this '
+                                 'JSON baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 latency slowdown against the '
+                                 'baseline, as a fraction.')
+
+    def handle(self, *args, **options):
+        if options['render']:
+            report = benchmark.render_templates()
+            self.print_report(report, ['renders', 'mean_ms', 'p95_ms'])
+            if options['output']:
+                with open(options['output'], 'w',
+                          encoding='utf-8') as output:
+                    json.dump(report, output, indent=2)
+            return
+        setup_test_environment()
+        with file_test_database(connection):
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False)
+            try:
+                dataset = benchmark.seed(
+                    options['questions'], options['choices'],
+                    options['users'], options['votes'], options['seed'])
+                report = benchmark.run(
+                    dataset, options['scenario'] or benchmark.SCENARIOS,
+                    options['requests'], options['concurrency'],
+                    options['seed'], options['interface'] or ['wsgi'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline:
+                regressions = benchmark.compare(report, json.load(baseline),
+                                                options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions from the baseline:\n'
+                                   + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions from the '
+                                                 'baseline.'))
+
+    def print_report(self, report, columns=None):
+        """Print the report as a table, one row per view."""
+        columns = columns or ['requests', 'errors', 'throughput', 'p50_ms',
+                              'p95_ms', 'p99_ms', 'queries', 'session_reads',
+                              'session_writes']
+        header = ''.join(f'{column:>15}' for column in columns)
+        self.stdout.write(f"{'view':<16}{header}")
+        for scenario, results in report.items():
+            values = ['-' if results.get(column) is None else results[column]
+                      for column in columns]
+            self.stdout.write(f'{scenario:<16}' + ''.join(
+                f'{value:>15}' for value in values))
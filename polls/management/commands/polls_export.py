@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.export import FORMATS, export_lines
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    """
+    Stream the per-choice tallies or the raw votes of a poll question.
+    """
+    help = 'Export the results or the raw votes of a poll as CSV or JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_id', type=int)
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            default='csv')
+        parser.add_argument('--votes', action='store_true',
+                            help='Export the raw votes instead of the '
+                                 'per-choice tallies.')
+        parser.add_argument('--output',
+                            help='File to write to (default: stdout).')
+        parser.add_argument('--chunk-size', type=int,
+                            default=settings.POLLS_EXPORT_CHUNK_SIZE,
+                            help='Votes read per database round trip.')
+
+    def handle(self, *args, **options):
+        try:
+            question = Question.objects.get(pk=options['question_id'])
+        except Question.DoesNotExist:
+            raise CommandError(f"Poll {options['question_id']} not found.")
+        lines = export_lines(question, options['format'],
+                             votes=options['votes'],
+                             chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
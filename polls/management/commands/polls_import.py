@@ -0,0 +1,316 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from polls.caching import (ALL_PAGES, invalidate_index, remember_votes,
+                           touch_pages)
+from polls.models import Choice, Question, Vote, VoteEvent
+
+# Models that can be imported, in the order their batches are written.
+MODELS = {
+    'auth.user': User,
+    'polls.question': Question,
+    'polls.choice': Choice,
+    'polls.vote': Vote,
+}
+
+# Foreign keys checked against the rows already known to the import.
+REFERENCES = {
+    'polls.choice': [('question', 'polls.question')],
+    'polls.vote': [('choice', 'polls.choice'), ('user', 'auth.user')],
+}
+
+
+def read_json(path, chunk_size=1 << 16):
+    """
+    Yield the objects of a JSON array file one by one, reading it in
+    chunks so the whole file is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    with open(path, encoding='utf-8') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            buffer += chunk
+            position = 0
+            while True:
+                while position < len(buffer) \
+                        and buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position == len(buffer):
+                    break
+                if not started:
+                    if buffer[position] != '[':
+                        raise CommandError(f'{path} is not a JSON array.')
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == ']':
+                    return
+                try:
+                    record, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if not chunk:
+                        raise CommandError(f'{path} ends in the middle of an '
+                                           f'object.')
+                    # The object continues in the next chunk.
+                    break
+                yield record
+            buffer = buffer[position:]
+            if not chunk:
+                if buffer.strip():
+                    raise CommandError(f'{path} is not a complete JSON '
+                                       f'array.')
+                return
+
+
+def read_jsonl(path):
+    """Yield the objects of a JSON Lines file one by one."""
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv(path):
+    """Yield the rows of a CSV file with a header row as dicts."""
+    with open(path, encoding='utf-8', newline='') as file:
+        yield from csv.DictReader(file)
+
+
+READERS = {'.json': read_json, '.jsonl': read_jsonl, '.csv': read_csv}
+
+
+def model_label(name):
+    """
+    Return the label of an importable model from a name such as 'vote',
+    'votes' or 'polls.vote', or None if no model matches.
+    """
+    name = name.lower()
+    for label in MODELS:
+        model_name = label.split('.')[1]
+        if name in (label, model_name, f'{model_name}s'):
+            return label
+    return None
+
+
+class Importer:
+    """
+    Importer validates records and writes them in bulk batches. It keeps
+    the primary keys of every known user, question and choice to check
+    the references of later records without querying the database.
+    """
+
+    def __init__(self, batch_size, strict):
+        self.batch_size = batch_size
+        self.strict = strict
+        self.pending = {label: [] for label in MODELS}
+        self.imported = {label: 0 for label in MODELS}
+        self.skipped = 0
+        self.known = {
+            'auth.user': set(User.objects.values_list('pk', flat=True)),
+            'polls.question': set(
+                Question.objects.values_list('pk', flat=True)),
+        }
+        # The question of each choice, to fill the question of votes.
+        self.choice_questions = dict(
+            Choice.objects.values_list('pk', 'question_id'))
+        self.known['polls.choice'] = self.choice_questions.keys()
+        self.vote_questions = set()
+
+    def add(self, record, default_label):
+        """
+        Validate a record and queue it for the next batch of its model.
+        Invalid records are counted and skipped, unless strict.
+        """
+        try:
+            label, instance = self.build(record, default_label)
+        except (ValidationError, ValueError, KeyError) as error:
+            if self.strict:
+                raise CommandError(f'Invalid record {record!r}: {error}')
+            self.skipped += 1
+            return
+        if label == 'polls.choice':
+            self.choice_questions[instance.pk] = instance.question_id
+        elif label == 'polls.vote':
+            instance.question_id = self.choice_questions[instance.choice_id]
+            self.vote_questions.add(instance.question_id)
+        else:
+            self.known[label].add(instance.pk)
+        self.pending[label].append(instance)
+        if len(self.pending[label]) >= self.batch_size:
+            self.write(label)
+
+    def build(self, record, default_label):
+        """
+        Build an unsaved model instance from a Django fixture record or
+        a flat record, converting and checking each field.
+        """
+        if 'model' in record and 'fields' in record:
+            label = record['model'].lower()
+            values = dict(record['fields'], pk=record.get('pk'))
+        else:
+            label = default_label
+            values = dict(record)
+            values.setdefault('pk', values.pop('id', None))
+        if label not in MODELS:
+            raise ValueError(f'cannot import model {label!r}')
+        model = MODELS[label]
+        fields = {}
+        for field in model._meta.concrete_fields:
+            if not field.editable and not field.primary_key:
+                continue
+            name = 'pk' if field.primary_key else field.name
+            for key in (name, field.attname):
+                if key in values:
+                    value = values[key]
+                    break
+            else:
+                continue
+            if value == '' and (field.null or field.primary_key):
+                value = None
+            if value is None and field.primary_key:
+                continue
+            fields[field.attname] = field.to_python(value)
+        if 'id' not in fields and label != 'polls.vote':
+            # Other records need their primary key to be referenced.
+            raise ValueError('missing primary key')
+        for field_name, target in REFERENCES.get(label, []):
+            if fields.get(f'{field_name}_id') not in self.known[target]:
+                raise ValueError(f'unknown {field_name} '
+                                 f'{fields.get(f"{field_name}_id")}')
+        return label, model(**fields)
+
+    def write(self, label):
+        """Write the queued batch of a model with one bulk upsert."""
+        instances, self.pending[label] = self.pending[label], []
+        if not instances:
+            return
+        model = MODELS[label]
+        if label == 'polls.vote':
+            Vote.objects.upsert(instances)
+            # Imported votes start their history in the event log.
+            VoteEvent.objects.bulk_create(
+                VoteEvent(user_id=vote.user_id, question_id=vote.question_id,
+                          choice_id=vote.choice_id) for vote in instances)
+            remember_votes({(vote.user_id, vote.question_id): vote.choice_id
+                            for vote in instances})
+        else:
+            features = connection.features
+            model.objects.bulk_create(
+                instances, update_conflicts=True,
+                unique_fields=['pk']
+                if features.supports_update_conflicts_with_target else None,
+                update_fields=[field.name
+                               for field in model._meta.concrete_fields
+                               if field.editable and not field.primary_key])
+        self.imported[label] += len(instances)
+
+    def write_all(self):
+        """Write the queued batches of every model in dependency order."""
+        for label in MODELS:
+            self.write(label)
+
+
+class Command(BaseCommand):
+    """
+    Import users, questions, choices and votes from large JSON, JSON Lines
+    or CSV exports, streaming them in bulk batches.
+    """
+    help = ('Stream users, questions, choices and votes from JSON (Django '
+            'fixture or plain arrays), JSONL or CSV files into the database '
+            'in bulk batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+',
+                            help='Files to import, in dependency order.')
+        parser.add_argument('--model',
+                            help='Model of plain records (user, question, '
+                                 'choice or vote). By default it is taken '
+                                 'from the file name.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written per bulk query.')
+        parser.add_argument('--transaction-size', type=int, default=50000,
+                            help='Records committed per transaction.')
+        parser.add_argument('--progress', type=int, default=100000,
+                            help='Report progress every this many records.')
+        parser.add_argument('--strict', action='store_true',
+                            help='Stop at the first invalid record instead '
+                                 'of skipping it.')
+
+    def handle(self, *args, **options):
+        importer = Importer(options['batch_size'], options['strict'])
+        started = time.monotonic()
+        records = 0
+        for name in options['files']:
+            path = Path(name)
+            reader = READERS.get(path.suffix.lower())
+            if reader is None:
+                raise CommandError(f'Unsupported file type: {path}')
+            if not path.exists():
+                raise CommandError(f'No such file: {path}')
+            default_label = model_label(options['model'] or path.stem)
+            stream = reader(path)
+            while True:
+                with transaction.atomic():
+                    count = 0
+                    for record in stream:
+                        importer.add(record, default_label)
+                        count += 1
+                        records += 1
+                        if records % options['progress'] == 0:
+                            self.report_progress(records, started)
+                        if count == options['transaction_size']:
+                            break
+                    importer.write_all()
+                if count < options['transaction_size']:
+                    break
+        self.reset_sequences(
+            [MODELS[label] for label, count in importer.imported.items()
+             if count])
+        if importer.vote_questions:
+            # Bulk writes bypass the signals that maintain the counters.
+            Choice.objects.filter(
+                question__in=importer.vote_questions).recount_votes()
+        if importer.imported['polls.question']:
+            # Bulk writes bypass the signal that materializes the status.
+            Question.objects.update_status(timezone.now())
+        invalidate_index()
+        touch_pages([ALL_PAGES])
+        elapsed = time.monotonic() - started
+        for label, count in importer.imported.items():
+            if count:
+                self.stdout.write(f'{label}: {count} row(s)')
+        if importer.skipped:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped {importer.skipped} invalid record(s).'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {records - importer.skipped} record(s) in '
+            f'{elapsed:.1f}s ({records / max(elapsed, 1e-9):.0f} '
+            f'records/s).'))
+
+    def reset_sequences(self, models):
+        """
+        Move the primary key sequences of the imported models past the
+        imported keys, as loaddata does, so new rows do not reuse them.
+        """
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+    def report_progress(self, records, started):
+        """Report the records read so far and the throughput."""
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'{records} record(s) read in {elapsed:.1f}s '
+                          f'({records / max(elapsed, 1e-9):.0f} records/s)')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from polls.caching import ALL_PAGES, touch_pages
+from polls.models import Choice
+
+
+class Command(BaseCommand):
+    """
+    Rebuild or verify the per-choice vote counters from the Vote table.
+    """
+    help = 'Rebuild (or verify with --check) the vote counters of choices.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report choices whose counter does '
+                                 'not match the Vote table.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drifted = Choice.objects.with_actual_votes().exclude(
+                vote_count=F('actual_votes')).order_by('pk')
+            for choice in drifted:
+                self.stdout.write(f'Choice {choice.pk} "{choice}": counter '
+                                  f'{choice.vote_count}, actual '
+                                  f'{choice.actual_votes}')
+            if drifted:
+                raise CommandError(f'{len(drifted)} vote counter(s) out of '
+                                   f'sync.')
+            self.stdout.write(self.style.SUCCESS('All vote counters are in '
+                                                 'sync.'))
+            return
+        updated = Choice.objects.recount_votes()
+        touch_pages([ALL_PAGES])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt vote counters of '
+                                             f'{updated} choice(s).'))
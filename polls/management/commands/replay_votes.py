@@ -0,0 +1,92 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from polls.caching import (ALL_PAGES, forget_votes, invalidate_index,
+                           touch_pages)
+from polls.models import Choice, Vote, VoteEvent
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the votes and the vote counters from the vote event log.
+    """
+    help = ('Rebuild (or verify with --check) the Vote table and the vote '
+            'counters from the append-only vote event log.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report votes that differ from the '
+                                 'event log.')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Votes read and written per query.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        batch_size = options['batch_size']
+        events = VoteEvent.objects.count()
+        votes = self.replayed_votes(batch_size)
+        if options['check']:
+            self.check_votes(votes)
+            return
+        written = 0
+        with transaction.atomic():
+            # The cached votes of the votes replaced or replayed.
+            changed = set(Vote.objects.values_list('user_id', 'question_id')
+                          .iterator(chunk_size=batch_size))
+            Vote.objects.all()._raw_delete(Vote.objects.db)
+            batch = []
+            for user_id, question_id, choice_id in votes:
+                changed.add((user_id, question_id))
+                batch.append(Vote(user_id=user_id, question_id=question_id,
+                                  choice_id=choice_id))
+                if len(batch) == batch_size:
+                    written += len(Vote.objects.bulk_create(batch))
+                    batch = []
+            written += len(Vote.objects.bulk_create(batch))
+            Choice.objects.recount_votes()
+        forget_votes(changed)
+        invalidate_index()
+        touch_pages([ALL_PAGES])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {events} event(s) into {written} vote(s) in '
+            f'{elapsed:.1f}s ({events / max(elapsed, 1e-9):.0f} '
+            f'events/s).'))
+
+    def replayed_votes(self, batch_size):
+        """
+        Yield the (user id, question id, choice id) of the votes the event
+        log adds up to, skipping deleted votes, and users and choices
+        deleted since.
+        """
+        users = set(User.objects.values_list('pk', flat=True))
+        choices = dict(Choice.objects.values_list('pk', 'question_id'))
+        for user_id, question_id, choice_id in VoteEvent.objects \
+                .latest_votes().iterator(chunk_size=batch_size):
+            if choice_id is not None and user_id in users \
+                    and choices.get(choice_id) == question_id:
+                yield user_id, question_id, choice_id
+
+    def check_votes(self, votes):
+        """Report the votes that differ from the replayed ones."""
+        replayed = {(user_id, question_id): choice_id
+                    for user_id, question_id, choice_id in votes}
+        current = {(user_id, question_id): choice_id
+                   for user_id, question_id, choice_id
+                   in Vote.objects.values_list('user_id', 'question_id',
+                                               'choice_id').iterator()}
+        differing = sorted(key for key in replayed.keys() | current.keys()
+                           if replayed.get(key) != current.get(key))
+        for user_id, question_id in differing:
+            self.stdout.write(
+                f'User {user_id}, question {question_id}: vote '
+                f'{current.get((user_id, question_id))}, events '
+                f'{replayed.get((user_id, question_id))}')
+        if differing:
+            raise CommandError(f'{len(differing)} vote(s) differ from the '
+                               f'event log.')
+        self.stdout.write(self.style.SUCCESS('All votes match the event '
+                                             'log.'))
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from polls.caching import ALL_PAGES, invalidate_index, touch_pages
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    """
+    Move the materialized status of questions (scheduled, open, closed)
+    at their publication and end dates.
+    """
+    help = ('Update the status of questions from their dates, once or, '
+            'with --watch, at every publication and end date.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true',
+                            help='Keep running, sleeping until the next '
+                                 'question opens or closes.')
+        parser.add_argument('--max-sleep', type=float, default=60.0,
+                            help='Longest sleep in seconds with --watch, to '
+                                 'pick up questions added meanwhile.')
+
+    def handle(self, *args, **options):
+        while True:
+            now = timezone.now()
+            updated = self.update(now)
+            if updated:
+                self.stdout.write(f'{now:%Y-%m-%d %H:%M:%S}: updated the '
+                                  f'status of {updated} question(s).')
+            if not options['watch']:
+                break
+            time.sleep(self.seconds_until_next(now, options['max_sleep']))
+        self.stdout.write(self.style.SUCCESS('Question statuses are up to '
+                                             'date.'))
+
+    def update(self, now):
+        """Update the statuses at 'now' and drop the pages showing them."""
+        updated = Question.objects.update_status(now)
+        if updated:
+            invalidate_index()
+            touch_pages([ALL_PAGES])
+        return updated
+
+    def seconds_until_next(self, now, max_sleep):
+        """Return how long to sleep until the next status transition."""
+        transition = Question.objects.next_transition(now)
+        if transition is None:
+            return max_sleep
+        delay = (transition - timezone.now()).total_seconds()
+        return min(max(delay, 0), max_sleep)
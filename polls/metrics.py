@@ -0,0 +1,181 @@
+"""
+Per-view request metrics of the polls app.
+
+QueryMetricsMiddleware (polls.middleware) measures each request: its
+total latency, the number and time of its SQL queries, and the time spent
+rendering templates through InstrumentedDjangoTemplates. The measures are
+kept in rolling histograms per URL name and exported in the Prometheus
+text format by the metrics view.
+"""
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+METRICS = {
+    'polls_request_duration_seconds': (
+        'Total request latency by view.', DURATION_BUCKETS),
+    'polls_db_queries': (
+        'SQL queries per request by view.', QUERY_BUCKETS),
+    'polls_db_duration_seconds': (
+        'Time spent in SQL queries per request by view.', DURATION_BUCKETS),
+    'polls_template_render_seconds': (
+        'Time spent rendering templates per request by view.',
+        DURATION_BUCKETS),
+}
+
+
+class RequestStats:
+    """RequestStats accumulates the measures of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+current_stats = ContextVar('polls_request_stats', default=None)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    A database execute wrapper that counts and times the queries of the
+    request being measured. It is installed on every connection and finds
+    the request through a context variable, which also follows the
+    queries run by the async ORM in a worker thread.
+    """
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def install_execute_wrapper(connection):
+    """Install execute_wrapper() on a database connection once."""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+class RollingHistogram:
+    """
+    RollingHistogram keeps the last 'window' observations of a measure
+    and counts them into fixed buckets on export.
+    """
+
+    def __init__(self, buckets, window):
+        self.buckets = buckets
+        self.values = deque(maxlen=window)
+
+    def observe(self, value):
+        """Record an observation, dropping the oldest beyond the window."""
+        self.values.append(value)
+
+    def snapshot(self):
+        """
+        Return the cumulative count of each bucket, the sum and the count
+        of the observations in the window.
+        """
+        values = list(self.values)
+        counts = [sum(1 for value in values if value <= bound)
+                  for bound in self.buckets]
+        return counts, sum(values), len(values)
+
+
+class MetricsRegistry:
+    """
+    MetricsRegistry holds a rolling histogram per metric and view.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, view, stats, duration):
+        """Record the measures of one request to a view."""
+        values = {
+            'polls_request_duration_seconds': duration,
+            'polls_db_queries': stats.queries,
+            'polls_db_duration_seconds': stats.db_time,
+            'polls_template_render_seconds': stats.template_time,
+        }
+        with self._lock:
+            for name, value in values.items():
+                key = (name, view)
+                if key not in self._histograms:
+                    self._histograms[key] = RollingHistogram(
+                        METRICS[name][1], self.window)
+                self._histograms[key].observe(value)
+
+    def clear(self):
+        """Drop every observation."""
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Return all histograms in the Prometheus text format."""
+        with self._lock:
+            snapshots = {key: histogram.snapshot()
+                         for key, histogram in self._histograms.items()}
+        lines = []
+        for name, (description, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, view), snapshot in sorted(snapshots.items()):
+                if metric != name:
+                    continue
+                counts, total, count = snapshot
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f'{name}_bucket{{view="{view}",'
+                                 f'le="{bound}"}} {bucket_count}')
+                lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} '
+                             f'{count}')
+                lines.append(f'{name}_sum{{view="{view}"}} {total:.6f}')
+                lines.append(f'{name}_count{{view="{view}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class _TimedTemplate:
+    """A template wrapper that adds its render time to the request stats."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats = current_stats.get()
+            if stats is not None:
+                stats.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing every template rendered for a
+    request measured by QueryMetricsMiddleware.
+    """
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
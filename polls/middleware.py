@@ -0,0 +1,107 @@
+import time
+from logging import getLogger
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import RequestStats, current_stats, registry
+from .routers import RoutingState, current_state
+
+
+class QueryMetricsMiddleware:
+    """
+    QueryMetricsMiddleware measures the latency, SQL queries and template
+    render time of every request into the rolling histograms of
+    polls.metrics, by URL name, and warns when a view runs more queries
+    than its budget in settings.POLLS_QUERY_BUDGETS. It runs natively in
+    both sync and async request handlers.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        registry.window = settings.POLLS_METRICS_WINDOW
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.observe(request, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.observe(request, stats, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, stats, duration):
+        """Record the measures of a request and check its query budget."""
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unresolved'
+        registry.observe(view, stats, duration)
+        budget = settings.POLLS_QUERY_BUDGETS.get(
+            view, settings.POLLS_QUERY_BUDGETS.get('default'))
+        if budget is not None and stats.queries > budget:
+            getLogger('polls').warning(
+                '%s ran %s queries, over its budget of %s (%s)', view,
+                stats.queries, budget, request.path)
+
+
+class ReplicaPinMiddleware:
+    """
+    ReplicaPinMiddleware tracks the database use of every request for
+    polls.routers.ReplicaRouter. A request that writes sets a cookie that
+    sends the reads of the client's next requests to the primary for
+    settings.POLLS_REPLICA_PIN_SECONDS.
+    """
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'polls_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(pinned=self.cookie_name in request.COOKIES)
+        token = current_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        state = RoutingState(pinned=self.cookie_name in request.COOKIES)
+        token = current_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_state.reset(token)
+        return self.pin(state, response)
+
+    def pin(self, state, response):
+        """Pin the client to the primary if the request wrote."""
+        if state.wrote and settings.POLLS_REPLICAS:
+            response.set_cookie(self.cookie_name, '1',
+                                max_age=settings.POLLS_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:40
+
+from django.db import migrations
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_vote_question(apps, schema_editor):
+    """
+    Fill the question of every vote from its choice, then keep only the
+    latest vote of a user for a question so the unique constraint can be
+    added.
+    """
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    Vote.objects.update(question=Subquery(
+        Choice.objects.filter(pk=OuterRef('choice')).values('question')[:1]))
+    duplicates = Vote.objects.values('user', 'question').order_by().annotate(
+        latest=Max('pk'), total=Count('pk')).filter(total__gt=1)
+    removed = 0
+    for duplicate in duplicates:
+        removed += Vote.objects.filter(
+            user=duplicate['user'], question=duplicate['question']
+        ).exclude(pk=duplicate['latest']).delete()[0]
+    if removed:
+        votes = Vote.objects.filter(choice=OuterRef('pk')).order_by(
+        ).values('choice').annotate(total=Count('pk')).values('total')
+        Choice.objects.update(vote_count=Coalesce(Subquery(votes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_vote_question'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_vote_question,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_status(apps, schema_editor):
+    """Set the status of the existing questions from their dates."""
+    Question = apps.get_model('polls', 'Question')
+    now = timezone.now()
+    Question.objects.filter(pub_date__gt=now).update(status='scheduled')
+    Question.objects.filter(end_date__lt=now).update(status='closed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0010_question_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('open', 'Open'), ('closed', 'Closed')], default='open', editable=False, max_length=9),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['status', '-pub_date'], name='polls_question_status_idx'),
+        ),
+        migrations.RunPython(fill_status, migrations.RunPython.noop),
+    ]
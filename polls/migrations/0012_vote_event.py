@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def log_existing_votes(apps, schema_editor):
+    """Start the event log with an event for each existing vote."""
+    Vote = apps.get_model('polls', 'Vote')
+    VoteEvent = apps.get_model('polls', 'VoteEvent')
+    votes = Vote.objects.order_by('pk').values_list(
+        'user_id', 'question_id', 'choice_id')
+    batch = []
+    for user_id, question_id, choice_id in votes.iterator(chunk_size=2000):
+        batch.append(VoteEvent(user_id=user_id, question_id=question_id,
+                               choice_id=choice_id))
+        if len(batch) == 2000:
+            VoteEvent.objects.bulk_create(batch)
+            batch = []
+    VoteEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('polls', '0011_question_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('previous_choice_id', models.BigIntegerField(blank=True, null=True)),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('choice', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='polls.choice')),
+                ('question', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='polls.question')),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(log_existing_votes, migrations.RunPython.noop),
+    ]
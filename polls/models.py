@@ -1,20 +1,225 @@
 import datetime
+import ipaddress
 
-from django.db import models
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import (BooleanField, Case, Count, F, OuterRef, Q,
+                              Max, Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 from django.contrib import admin
 from django.contrib.auth.models import User
 
 
+class QuestionQuerySet(models.QuerySet):
+    """
+    QuestionQuerySet provides the publication and voting filters of
+    questions evaluated in SQL.
+    """
+
+    def published(self, now):
+        """Filter the questions published at the given instant."""
+        return self.filter(pub_date__lte=now)
+
+    def with_open_state(self, now):
+        """
+        Annotate each question with 'is_open', whether it allows voting
+        at the given instant, following the same rules as can_vote().
+        """
+        return self.annotate(is_open=Case(
+            When(Q(pub_date__lte=now)
+                 & (Q(end_date__isnull=True) | Q(end_date__gte=now)),
+                 then=Value(True)),
+            default=Value(False), output_field=BooleanField()))
+
+    def with_totals(self):
+        """
+        Annotate each question with 'total_votes', the sum of the vote
+        counters of its choices, and 'choice_count', its number of
+        choices, as correlated subqueries so the questions are not grouped.
+        """
+        choices = Choice.objects.filter(question=OuterRef('pk')).order_by(
+        ).values('question')
+        return self.annotate(
+            total_votes=Coalesce(Subquery(choices.annotate(
+                total=Sum('vote_count')).values('total')), 0),
+            choice_count=Coalesce(Subquery(choices.annotate(
+                count=Count('pk')).values('count')), 0))
+
+    def by_status(self, status, now):
+        """
+        Filter the questions in the given status at the given instant for
+        listings. While the update_poll_status command keeps the
+        materialized status current (settings.POLLS_STATUS_UPDATES), it is
+        a single indexed predicate; otherwise the dates are compared, as
+        in in_status().
+        """
+        if settings.POLLS_STATUS_UPDATES:
+            return self.filter(status=status)
+        return self.in_status(status, now)
+
+    def in_status(self, status, now):
+        """
+        Filter the questions in the given status at the given instant by
+        their dates, following the same rules as can_vote(), whether or
+        not their materialized status is current.
+        """
+        conditions = {
+            Question.Status.SCHEDULED: Q(pub_date__gt=now),
+            Question.Status.OPEN: Q(pub_date__lte=now) & (
+                Q(end_date__isnull=True) | Q(end_date__gte=now)),
+            Question.Status.CLOSED: Q(end_date__lt=now),
+        }
+        return self.filter(conditions[status])
+
+    def update_status(self, now):
+        """
+        Move the status of each question to the one its dates give at the
+        given instant.
+
+        :return: The number of questions whose status changed.
+        """
+        return sum(self.in_status(status, now).exclude(status=status)
+                   .update(status=status) for status in Question.Status)
+
+    def next_transition(self, now):
+        """
+        Return the first instant after 'now' at which a question changes
+        status, or None if no question will.
+        """
+        opening = self.filter(pub_date__gt=now).order_by('pub_date') \
+            .values_list('pub_date', flat=True).first()
+        # Open questions close just after their end date.
+        closing = self.filter(end_date__gte=now).order_by('end_date') \
+            .values_list('end_date', flat=True).first()
+        if closing is not None:
+            closing += datetime.timedelta(microseconds=1)
+        instants = [instant for instant in (opening, closing)
+                    if instant is not None]
+        return min(instants, default=None)
+
+    def after(self, pub_date, pk):
+        """
+        Filter the questions that come after the given question in the
+        newest first order, for keyset pagination.
+        """
+        return self.filter(Q(pub_date__lt=pub_date)
+                           | Q(pub_date=pub_date, pk__lt=pk))
+
+    def close(self, now):
+        """
+        End voting on the open questions at the given instant in a single
+        UPDATE.
+
+        :return: The number of questions closed.
+        """
+        return self.filter(pub_date__lte=now).filter(
+            Q(end_date__isnull=True) | Q(end_date__gt=now)
+        ).update(end_date=now, status=Question.Status.CLOSED)
+
+    def extend(self, period, now):
+        """
+        Push the end date of the questions that have one 'period' past
+        their end date, or past 'now' for closed questions, which reopens
+        them.
+
+        :return: The number of questions extended.
+        """
+        with transaction.atomic(using=self.db):
+            extended = self.filter(end_date__isnull=False).update(
+                end_date=Greatest(F('end_date'), Value(now)) + period)
+            self.update_status(now)
+        return extended
+
+    def clone(self, now):
+        """
+        Copy the questions with their choices, without votes, using one
+        bulk INSERT for the questions and one for the choices.
+
+        :return: The list of new questions.
+        """
+        originals = list(self.order_by('pk').prefetch_related('choice_set'))
+        clones = [Question(question_text=question.question_text,
+                           pub_date=question.pub_date,
+                           end_date=question.end_date,
+                           status=question.status_at(now))
+                  for question in originals]
+        with transaction.atomic(using=self.db):
+            if connections[self.db].features \
+                    .can_return_rows_from_bulk_insert:
+                Question.objects.using(self.db).bulk_create(clones)
+            else:
+                # The primary keys of the clones are needed by their choices.
+                for question in clones:
+                    question.save(using=self.db)
+            Choice.objects.using(self.db).bulk_create(
+                Choice(question=clone, choice_text=choice.choice_text)
+                for original, clone in zip(originals, clones)
+                for choice in original.choice_set.all())
+        return clones
+
+    def reset_votes(self):
+        """
+        Delete every vote of the questions in a single DELETE, without
+        loading the votes as models or sending their signals, log the
+        deletes in the event log and zero the vote counters of their
+        choices.
+
+        :return: The (user id, question id) of each vote deleted.
+        """
+        with transaction.atomic(using=self.db):
+            # Read once, as zeroing the counters may change which
+            # questions a filter on their totals selects.
+            question_ids = list(self.values_list('pk', flat=True))
+            votes = Vote.objects.using(self.db).filter(
+                question__in=question_ids)
+            deleted = list(votes.values_list('user_id', 'question_id',
+                                             'choice_id'))
+            votes._raw_delete(self.db)
+            VoteEvent.objects.using(self.db).bulk_create(
+                VoteEvent(user_id=user_id, question_id=question_id,
+                          choice=None, previous_choice_id=choice_id)
+                for user_id, question_id, choice_id in deleted)
+            Choice.objects.using(self.db).filter(
+                question__in=question_ids).update(vote_count=0)
+        return [(user_id, question_id)
+                for user_id, question_id, _ in deleted]
+
+
 class Question(models.Model):
     """
     Question Model represents a question with its text,
     publication and end dates.
     """
+    class Status(models.TextChoices):
+        """The voting status of a question given its dates."""
+        SCHEDULED = 'scheduled', 'Scheduled'
+        OPEN = 'open', 'Open'
+        CLOSED = 'closed', 'Closed'
+
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField('date published', default=timezone.now)
     end_date = models.DateTimeField('date ended', default=None, null=True,
                                     blank=True)
+    # Materialized from the dates when a question is saved, and moved at
+    # the date boundaries by the update_poll_status command.
+    status = models.CharField(max_length=9, choices=Status.choices,
+                              default=Status.OPEN, editable=False)
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listing of published questions, newest first.
+            models.Index(fields=['-pub_date'],
+                         name='polls_question_pub_date_idx'),
+            # Questions open for voting at a given instant.
+            models.Index(fields=['end_date', 'pub_date'],
+                         name='polls_question_window_idx'),
+            # Questions in a status, newest first.
+            models.Index(fields=['status', '-pub_date'],
+                         name='polls_question_status_idx'),
+        ]
 
     def __str__(self):
         """
@@ -46,10 +251,22 @@ class Question(models.Model):
         now = timezone.now()
         return self.pub_date <= now
 
+    def status_at(self, now):
+        """
+        Return the status of the question at the given instant from its
+        publication date and end date (if any).
+        """
+        if now < self.pub_date:
+            return self.Status.SCHEDULED
+        if self.end_date is not None and now > self.end_date:
+            return self.Status.CLOSED
+        return self.Status.OPEN
+
     def can_vote(self):
         """
         Check if the question allows voting at a current time based on
-        the publication date and end date (if any).
+        the publication date and end date (if any). Unlike the status
+        field, it is always exact.
 
         :return: True for questions that allows voting at a current time,
                  False otherwise.
@@ -59,6 +276,77 @@ class Question(models.Model):
             return self.pub_date <= now <= self.end_date
         return self.pub_date <= now
 
+    def _results_queryset(self):
+        """Return the choices of this question with their vote totals."""
+        return self.choice_set.order_by('pk').values(
+            'id', 'choice_text', votes=F('vote_count'))
+
+    def _summarize_results(self, choices):
+        """Add the total votes and percentages to the choice totals."""
+        total_votes = sum(choice['votes'] for choice in choices)
+        for choice in choices:
+            choice['percentage'] = round(
+                choice['votes'] * 100 / total_votes, 1) if total_votes else 0.0
+        return {'id': self.id, 'question_text': self.question_text,
+                'total_votes': total_votes, 'choices': choices}
+
+    def get_results(self):
+        """
+        Collect the vote totals of this question from the maintained
+        per-choice counters in a single query.
+
+        :return: A dict with the question id and text, the total votes and
+                 a list of choices, each with its id, text, votes and
+                 percentage of the total votes.
+        """
+        return self._summarize_results(list(self._results_queryset()))
+
+    async def aget_results(self):
+        """Asynchronous version of get_results()."""
+        return self._summarize_results(
+            [choice async for choice in self._results_queryset()])
+
+
+class ChoiceQuerySet(models.QuerySet):
+    """
+    ChoiceQuerySet provides set-based operations on the vote counters
+    of choices.
+    """
+
+    def with_actual_votes(self):
+        """
+        Annotate each choice with the number of Vote rows that currently
+        reference it, as 'actual_votes'.
+        """
+        return self.annotate(actual_votes=Count('vote'))
+
+    def recount_votes(self):
+        """
+        Rebuild the vote counter of every choice in this queryset from
+        the Vote table in a single UPDATE.
+
+        :return: The number of choices updated.
+        """
+        votes = Vote.objects.filter(choice=OuterRef('pk')).order_by(
+        ).values('choice').annotate(total=Count('pk')).values('total')
+        return self.update(vote_count=Coalesce(Subquery(votes), 0))
+
+    def add_votes(self, amounts):
+        """
+        Add an amount (may be negative) to the vote counter of each choice
+        in a single UPDATE.
+
+        :param amounts: A dict mapping choice ids to the amount to add.
+        :return: The number of choices updated.
+        """
+        amounts = {pk: amount for pk, amount in amounts.items() if amount}
+        if not amounts:
+            return 0
+        whens = [When(pk=pk, then=Value(amount))
+                 for pk, amount in amounts.items()]
+        return self.filter(pk__in=amounts).update(
+            vote_count=F('vote_count') + Case(*whens, default=Value(0)))
+
 
 class Choice(models.Model):
     """
@@ -67,11 +355,18 @@ class Choice(models.Model):
     """
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
+    vote_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ChoiceQuerySet.as_manager()
 
     @property
     def votes(self):
-        """Count the votes for this choice."""
-        return self.vote_set.count()
+        """
+        Return the votes for this choice from the maintained counter.
+        The counter is kept in sync with the Vote table by the signal
+        handlers in polls.signals.
+        """
+        return self.vote_count
 
     def __str__(self):
         """
@@ -80,7 +375,178 @@ class Choice(models.Model):
         return self.choice_text
 
 
+class VoteQuerySet(models.QuerySet):
+    """
+    VoteQuerySet provides the atomic vote casting of the vote path.
+    """
+
+    def upsert(self, votes):
+        """
+        Insert the given votes, or switch the choice of an existing vote
+        of the same user for the same question, in one
+        INSERT ... ON CONFLICT DO UPDATE statement. The vote counters are
+        not adjusted.
+        """
+        features = connections[self.db].features
+        unique_fields = ['user', 'question'] \
+            if features.supports_update_conflicts_with_target else None
+        return self.bulk_create(votes, update_conflicts=True,
+                                unique_fields=unique_fields,
+                                update_fields=['choice'])
+
+    def _lock_voter(self, user):
+        """
+        Lock the row of a user until the end of the transaction, so the
+        casts of a user run one after another. The vote itself cannot be
+        locked before the user's first vote for a question exists.
+
+        SQLite has no row locks, and a transaction that reads before it
+        writes fails with "database is locked" once another connection
+        has written in between. There a no-op update takes the write lock
+        of the database first, waiting for it like any other write.
+        """
+        users = User.objects.using(self.db).filter(pk=user.pk)
+        if connections[self.db].features.has_select_for_update:
+            list(users.select_for_update().values_list('pk', flat=True))
+        else:
+            users.update(is_active=F('is_active'))
+
+    def cast(self, user, choice, ip_address=None):
+        """
+        Cast the vote of a user for a choice, replacing any previous vote
+        of the user for the same question, adjust the vote counters and
+        append the vote to the event log. The upsert sends no post_save,
+        so the results of the question are marked as changed on commit.
+
+        :return: The id of the previously voted choice, or None if the
+                 user had not voted for this question.
+        """
+        # Imported here, as the cache helpers depend on the models.
+        from .caching import touch_pages
+        from .live import get_live_results
+
+        def changed():
+            touch_pages([f'results:{choice.question_id}'])
+            get_live_results().mark_changed([choice.question_id])
+
+        with transaction.atomic(using=self.db):
+            self._lock_voter(user)
+            previous_choice_id = self.filter(
+                user=user, question_id=choice.question_id
+            ).values_list('choice_id', flat=True).first()
+            self.upsert([Vote(user=user, question_id=choice.question_id,
+                              choice=choice)])
+            if previous_choice_id != choice.id:
+                amounts = {choice.id: 1}
+                if previous_choice_id is not None:
+                    amounts[previous_choice_id] = -1
+                Choice.objects.using(self.db).add_votes(amounts)
+            VoteEvent.objects.using(self.db).create(
+                user=user, question_id=choice.question_id, choice=choice,
+                previous_choice_id=previous_choice_id,
+                ip=valid_ip(ip_address))
+            transaction.on_commit(changed, using=self.db)
+        return previous_choice_id
+
+
 class Vote(models.Model):
     """Vote model records a Vote of a Choice by a User."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    objects = VoteQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'],
+                                    name='unique_vote_per_question'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the choice a vote was loaded with, so a switch of choice
+        can be detected when the vote is saved again.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_choice_id = instance.__dict__.get('choice_id')
+        return instance
+
+
+class VoteEventQuerySet(models.QuerySet):
+    """
+    VoteEventQuerySet replays vote events and refuses to change them.
+    """
+
+    def latest_votes(self):
+        """
+        Return the (user id, question id, choice id) of the latest event
+        of each user for each question, the votes the events add up to.
+        The choice id is None where the latest event deleted the vote.
+        """
+        latest = self.order_by().values('user', 'question').annotate(
+            last=Max('pk')).values('last')
+        return VoteEvent.objects.using(self.db).filter(
+            pk__in=Subquery(latest)).order_by('pk').values_list(
+            'user_id', 'question_id', 'choice_id')
+
+    def update(self, **kwargs):
+        raise TypeError('Vote events are append-only.')
+
+    def delete(self):
+        raise TypeError('Vote events are append-only.')
+
+
+def valid_ip(ip_address):
+    """
+    Return the given IP address if it is a valid IPv4 or IPv6 address,
+    otherwise None, as client supplied headers may hold anything.
+    """
+    try:
+        return str(ipaddress.ip_address(ip_address))
+    except ValueError:
+        return None
+
+
+class VoteEvent(models.Model):
+    """
+    VoteEvent records one vote cast, switched or deleted by a user, with
+    its time and IP address. Events are only ever appended, and keep their
+    ids after the user, question or choice is deleted, so the Vote table
+    and the tallies can be audited and rebuilt from them.
+    """
+    created = models.DateTimeField(default=timezone.now)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING,
+                             db_constraint=False, db_index=False,
+                             related_name='+')
+    question = models.ForeignKey(Question, on_delete=models.DO_NOTHING,
+                                 db_constraint=False, related_name='+')
+    # The choice voted for, or null when the vote was deleted.
+    choice = models.ForeignKey(Choice, on_delete=models.DO_NOTHING,
+                               db_constraint=False, db_index=False,
+                               null=True, blank=True, related_name='+')
+    # The choice the vote switched from, or null for a first vote.
+    previous_choice_id = models.BigIntegerField(null=True, blank=True)
+    ip = models.GenericIPAddressField(null=True, blank=True)
+
+    objects = VoteEventQuerySet.as_manager()
+
+    @property
+    def is_switch(self):
+        """Whether the event switched an existing vote."""
+        return self.previous_choice_id is not None \
+            and self.choice_id is not None
+
+    @property
+    def is_delete(self):
+        """Whether the event deleted a vote."""
+        return self.choice_id is None
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError('Vote events are append-only.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError('Vote events are append-only.')
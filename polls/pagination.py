@@ -0,0 +1,97 @@
+"""
+Keyset (cursor) pagination of questions in the newest first order.
+"""
+import base64
+import binascii
+import datetime
+
+from django.utils.functional import cached_property
+
+
+def encode_cursor(pub_date, pk):
+    """
+    Return an opaque cursor pointing after the question with the given
+    publication date and primary key.
+    """
+    key = f'{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor().
+
+    :return: A (pub_date, pk) tuple, or None for a missing or malformed
+             cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        pub_date, pk = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split('|')
+        return datetime.datetime.fromisoformat(pub_date), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    """
+    KeysetPage is one page of a newest first question queryset, starting
+    after the question the cursor points to. The page is only queried
+    when it is first used, so a page rendered from a cached fragment
+    costs no query.
+    """
+
+    def __init__(self, queryset, cursor, page_size):
+        position = decode_cursor(cursor)
+        # The normalized cursor, an empty string for the first page.
+        self.cursor = encode_cursor(*position) if position else ''
+        if position is not None:
+            queryset = queryset.after(*position)
+        self.queryset = queryset.order_by('-pub_date', '-pk')
+        self.page_size = page_size
+
+    @cached_property
+    def _rows(self):
+        """Fetch the page and one more question to tell if a next exists."""
+        return list(self.queryset[:self.page_size + 1])
+
+    def set_rows(self, rows):
+        """
+        Use the given questions, newest first, as the fetched rows of the
+        page instead of querying them. One more question than the page
+        size tells that a next page exists.
+        """
+        self.__dict__['_rows'] = list(rows)
+
+    async def aload(self):
+        """Fetch the page with the asynchronous ORM."""
+        self.set_rows([question async for question
+                       in self.queryset[:self.page_size + 1]])
+
+    @property
+    def object_list(self):
+        """The questions of this page."""
+        return self._rows[:self.page_size]
+
+    @property
+    def has_next(self):
+        """Whether there are questions after this page."""
+        return len(self._rows) > self.page_size
+
+    @property
+    def next_cursor(self):
+        """The cursor of the next page, or None on the last page."""
+        if self.has_next:
+            last = self.object_list[-1]
+            return encode_cursor(last.pub_date, last.pk)
+        return None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
@@ -0,0 +1,208 @@
+"""
+Rate limiting of the vote and signup views.
+
+rate_limit() limits the POST requests to a view per client IP address and
+per logged in user, by the limits of its route in settings.POLLS_RATE_LIMITS
+such as {'ip': '60/m', 'user': '20/m'}. Each limit is a number of requests
+per second, minute, hour or day, which can be spent in a burst and is
+refilled continuously. Requests over a limit are answered with 429 Too
+Many Requests before the view runs, so they cost no database query beyond
+reading the session.
+
+The IP address limits are keyed on the address of the connection, or the
+address seen by the outermost of settings.POLLS_TRUSTED_PROXIES proxies
+in front of the app, never on X-Forwarded-For entries a client can add.
+
+settings.POLLS_RATE_LIMIT_BACKEND selects where requests are counted:
+'locmem' keeps a token bucket per key in the memory of each process, and
+'cache' counts requests in sliding windows in the default cache, shared
+by every worker using the same cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Return the number of requests and the period in seconds of a rate
+    such as '20/m'.
+    """
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0].lower()]
+
+
+class TokenBuckets:
+    """
+    TokenBuckets keeps a token bucket per key in memory. A bucket holds
+    up to 'count' tokens, refills at 'count' tokens per period and each
+    request takes one. At most 'max_keys' buckets are kept, dropping the
+    least recently used ones first.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def hit(self, key, count, period):
+        """
+        Take a token for a request.
+
+        :return: 0 if the request is allowed, otherwise the seconds until
+                 a token is available.
+        """
+        now = time.monotonic()
+        refill = count / period
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (count, now))
+            tokens = min(count, tokens + (now - updated) * refill)
+            wait = 0
+            if tokens < 1:
+                wait = (1 - tokens) / refill
+            else:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        """Drop every bucket."""
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheWindows:
+    """
+    CacheWindows counts requests per key in the default cache, in fixed
+    windows of one period. The count of the sliding window ending now is
+    estimated from the current window and the part of the previous window
+    it still covers.
+    """
+
+    def hit(self, key, count, period):
+        """
+        Count a request.
+
+        :return: 0 if the request is allowed, otherwise the seconds until
+                 the window has room again.
+        """
+        now = time.time()
+        window = int(now // period)
+        current_key = f'polls:ratelimit:{key}:{window}'
+        cache.add(current_key, 0, period * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # The key expired between add() and incr().
+            cache.set(current_key, 1, period * 2)
+            current = 1
+        previous = cache.get(f'polls:ratelimit:{key}:{window - 1}', 0)
+        elapsed = now / period - window
+        if previous * (1 - elapsed) + current <= count:
+            return 0
+        return (1 - elapsed) * period
+
+    def clear(self):
+        """Windows expire by themselves."""
+
+
+BACKENDS = {'locmem': TokenBuckets, 'cache': CacheWindows}
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_counter():
+    """Return the request counter of settings.POLLS_RATE_LIMIT_BACKEND."""
+    backend = settings.POLLS_RATE_LIMIT_BACKEND
+    with _counters_lock:
+        if backend not in _counters:
+            _counters[backend] = BACKENDS[backend]()
+        return _counters[backend]
+
+
+def client_address(request):
+    """
+    Return the IP address the limits of a request are keyed on: the peer
+    of the connection, or the address the outermost of
+    settings.POLLS_TRUSTED_PROXIES proxies received the request from, the
+    entry each proxy appends to X-Forwarded-For.
+    """
+    addresses = [request.META.get('REMOTE_ADDR')]
+    proxies = settings.POLLS_TRUSTED_PROXIES
+    if proxies:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        addresses = [address.strip() for address in forwarded.split(',')
+                     if address.strip()] + addresses
+    return addresses[max(0, len(addresses) - 1 - proxies)]
+
+
+def check_limits(route, request):
+    """
+    Count a request to a route against its limits.
+
+    :return: 0 if the request is allowed, otherwise the seconds the client
+             should wait.
+    """
+    limits = settings.POLLS_RATE_LIMITS.get(route)
+    if not limits or request.method != 'POST':
+        return 0
+    keys = {'ip': client_address(request)}
+    if 'user' in limits:
+        # The id of the logged in user, read without loading the user.
+        keys['user'] = request.session.get(SESSION_KEY)
+    counter = get_counter()
+    for scope, rate in limits.items():
+        if keys.get(scope) is None:
+            continue
+        wait = counter.hit(f'{route}:{scope}:{keys[scope]}',
+                           *parse_rate(rate))
+        if wait:
+            return wait
+    return 0
+
+
+def too_many_requests(wait):
+    """Return a 429 response asking the client to retry after 'wait'."""
+    response = HttpResponse('Too many requests, please try again later.',
+                            status=429, content_type='text/plain')
+    response['Retry-After'] = str(max(1, round(wait)))
+    return response
+
+
+def rate_limit(route):
+    """
+    Limit the POST requests to a view by the limits of 'route' in
+    settings.POLLS_RATE_LIMITS.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # Reading the session may query the database.
+                wait = await sync_to_async(check_limits)(route, request)
+                if wait:
+                    return too_many_requests(wait)
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            wait = check_limits(route, request)
+            if wait:
+                return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,63 @@
+"""
+Routing of the polls app's reads to read replicas.
+
+During a request, ReplicaRouter sends the reads of polls models to one of
+the database aliases in settings.POLLS_REPLICAS, and every write to the
+primary ('default'). Once a request has written, its later reads go to
+the primary too, and ReplicaPinMiddleware (polls.middleware) keeps the
+client on the primary for settings.POLLS_REPLICA_PIN_SECONDS, so a voter
+sees their own vote before the replicas catch up. Reads outside requests,
+such as management commands, always go to the primary.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+class RoutingState:
+    """RoutingState tracks the database use of one request."""
+
+    def __init__(self, pinned=False):
+        # Whether the client wrote recently and must read the primary.
+        self.pinned = pinned
+        # Whether the request has written to the primary.
+        self.wrote = False
+
+    @property
+    def use_primary(self):
+        """Whether reads of the request must go to the primary."""
+        return self.pinned or self.wrote
+
+
+# A mutable state, so writes made by the async ORM in a worker thread
+# (running in a copy of the context) are seen by the request.
+current_state = ContextVar('polls_routing_state', default=None)
+
+
+class ReplicaRouter:
+    """
+    ReplicaRouter sends the reads of the polls app to the replicas and
+    all writes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = current_state.get()
+        if model._meta.app_label != 'polls' or state is None \
+                or state.use_primary or not settings.POLLS_REPLICAS:
+            return None
+        return random.choice(settings.POLLS_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = current_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Allow relations between objects of the primary and replicas."""
+        databases = {DEFAULT_DB_ALIAS, *settings.POLLS_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
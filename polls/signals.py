@@ -0,0 +1,108 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import (forget_vote, invalidate_index, remember_votes,
+                      touch_pages)
+from .live import get_live_results
+from .metrics import install_execute_wrapper
+from .models import Choice, Question, Vote, VoteEvent
+
+
+@receiver(pre_save, sender=Vote)
+def fill_vote_question(sender, instance, **kwargs):
+    """
+    Fill the denormalized question of a vote from its choice, including
+    votes loaded from fixtures without one.
+    """
+    if instance.question_id is None:
+        instance.question_id = Choice.objects.values_list(
+            'question_id', flat=True).get(pk=instance.choice_id)
+
+
+@receiver(pre_save, sender=Question)
+def fill_question_status(sender, instance, **kwargs):
+    """
+    Materialize the status of a question from its dates, including
+    questions loaded from fixtures.
+    """
+    instance.status = instance.status_at(timezone.now())
+
+
+@receiver(post_save, sender=Vote)
+def count_saved_vote(sender, instance, created, using, **kwargs):
+    """
+    Keep the vote counters and the event log in sync when a vote is cast
+    or switched to another choice, including votes loaded from fixtures.
+    """
+    previous_choice_id = getattr(instance, '_loaded_choice_id', None)
+    if created:
+        Choice.objects.add_votes({instance.choice_id: 1})
+    elif previous_choice_id is not None \
+            and previous_choice_id != instance.choice_id:
+        Choice.objects.add_votes({previous_choice_id: -1,
+                                  instance.choice_id: 1})
+    if created or previous_choice_id != instance.choice_id:
+        VoteEvent.objects.using(using).create(
+            user_id=instance.user_id, question_id=instance.question_id,
+            choice_id=instance.choice_id,
+            previous_choice_id=None if created else previous_choice_id)
+    instance._loaded_choice_id = instance.choice_id
+    remember_votes({(instance.user_id, instance.question_id):
+                    instance.choice_id})
+
+
+@receiver(post_delete, sender=Vote)
+def count_deleted_vote(sender, instance, **kwargs):
+    """
+    Keep the vote counters in sync when a vote is deleted, including
+    deletes cascading from a User or Choice.
+    """
+    Choice.objects.add_votes({instance.choice_id: -1})
+    forget_vote(instance.user_id, instance.question_id)
+
+
+@receiver(post_delete, sender=Vote)
+def log_deleted_vote(sender, instance, using, **kwargs):
+    """
+    Append the delete of a vote to the event log, so replaying the log
+    does not bring the vote back.
+    """
+    VoteEvent.objects.using(using).create(
+        user_id=instance.user_id, question_id=instance.question_id,
+        choice=None, previous_choice_id=instance.choice_id)
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def push_live_results(sender, instance, **kwargs):
+    """
+    Mark the live results and the cached results page of the question of
+    a vote as changed.
+    """
+    def changed():
+        get_live_results().mark_changed([instance.question_id])
+        touch_pages([f'results:{instance.question_id}'])
+    transaction.on_commit(changed)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_cached_pages(sender, instance, **kwargs):
+    """
+    Drop the cached index pages and results page of a question when it
+    or one of its choices changes.
+    """
+    invalidate_index()
+    question_id = instance.pk if sender is Question else instance.question_id
+    touch_pages(['index', f'results:{question_id}'])
+
+
+@receiver(connection_created)
+def measure_connection(sender, connection, **kwargs):
+    """Count the queries of every new connection in the request metrics."""
+    install_execute_wrapper(connection)
@@ -0,0 +1,195 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from polls import live
+from polls.caching import _previous_vote_key
+from polls.live import LiveResults
+from polls.models import Choice, Question, Vote
+
+
+def create_question(question_text, days=-1, votes=()):
+    """
+    Create a question with the given 'question_text' published the given
+    number of 'days' offset to now, with a choice for each vote counter.
+    """
+    question = Question.objects.create(
+        question_text=question_text,
+        pub_date=timezone.now() + datetime.timedelta(days=days))
+    Choice.objects.bulk_create(
+        Choice(question=question, choice_text=f'Choice {count}',
+               vote_count=vote_count)
+        for count, vote_count in enumerate(votes, start=1))
+    return question
+
+
+class QuestionChangelistTests(TestCase):
+    def setUp(self):
+        """Set up an admin and questions with different vote totals."""
+        super().setUp()
+        self.admin = User.objects.create_superuser(username='admin',
+                                                   password='password123')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:polls_question_changelist')
+        self.unvoted = create_question('Unvoted.', votes=(0, 0))
+        self.popular = create_question('Popular.', votes=(80, 40, 5))
+        self.scheduled = create_question('Scheduled.', days=1, votes=(3,))
+
+    def get_changelist(self, **params):
+        """Return the questions listed by the changelist, in order."""
+        response = self.client.get(self.url, params)
+        self.assertEqual(200, response.status_code)
+        return list(response.context['cl'].result_list)
+
+    def test_totals(self):
+        """The changelist shows the total votes and choices of each row."""
+        totals = {question.question_text: (question.choice_count,
+                                           question.total_votes)
+                  for question in self.get_changelist()}
+        self.assertEqual({'Unvoted.': (2, 0), 'Popular.': (3, 125),
+                          'Scheduled.': (1, 3)}, totals)
+
+    def test_totals_match_votes(self):
+        """The totals follow the vote counters maintained by votes."""
+        user = User.objects.create_user(username='voter')
+        Vote.objects.create(user=user,
+                            choice=self.unvoted.choice_set.first())
+        unvoted = Question.objects.with_totals().get(pk=self.unvoted.pk)
+        self.assertEqual(1, unvoted.total_votes)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """The changelist runs the same queries for 3 or 30 questions."""
+        with CaptureQueriesContext(connection) as few:
+            self.get_changelist()
+        for count in range(27):
+            create_question(f'Question {count}.', votes=(count, 1))
+        with CaptureQueriesContext(connection) as many:
+            self.get_changelist()
+        self.assertEqual(len(few), len(many))
+
+    def test_sort_by_total_votes(self):
+        """Sorting by total votes is done by the database."""
+        questions = self.get_changelist(o='-6')
+        self.assertEqual([self.popular, self.scheduled, self.unvoted],
+                         questions)
+
+    def test_filter_by_total_votes(self):
+        """The total votes filter keeps the questions in its range."""
+        self.assertEqual([self.unvoted], self.get_changelist(votes='none'))
+        self.assertEqual([self.popular], self.get_changelist(votes='many'))
+
+    def test_filter_by_status(self):
+        """The status filter keeps the questions in that status."""
+        self.assertEqual([self.scheduled],
+                         self.get_changelist(status='scheduled'))
+
+    def test_status_follows_dates(self):
+        """
+        The status column and filter follow the dates of the questions,
+        even before update_poll_status has moved their status.
+        """
+        Question.objects.filter(pk=self.popular.pk).update(
+            end_date=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual([self.popular], self.get_changelist(status='closed'))
+        response = self.client.get(self.url, {'status': 'closed'})
+        self.assertContains(response, '<td class="field-current_status">'
+                                      'Closed</td>', html=True)
+
+
+class QuestionActionTests(TestCase):
+    def setUp(self):
+        """Set up an admin, a voter and open and closed questions."""
+        super().setUp()
+        self.admin = User.objects.create_superuser(username='admin',
+                                                   password='password123')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:polls_question_changelist')
+        self.open = create_question('Open.', votes=(0, 0))
+        self.closed = create_question('Closed.', days=-10, votes=(0,))
+        Question.objects.filter(pk=self.closed.pk).update(
+            end_date=timezone.now() - datetime.timedelta(days=1))
+        Question.objects.update_status(timezone.now())
+        self.voter = User.objects.create_user(username='voter')
+        Vote.objects.create(user=self.voter,
+                            choice=self.open.choice_set.first())
+
+    def run_action(self, action, questions, **filters):
+        """
+        Run an admin action on the questions, listed with the given
+        filters, and return its message.
+        """
+        url = f'{self.url}?{urlencode(filters)}' if filters else self.url
+        response = self.client.post(url, {
+            'action': action,
+            '_selected_action': [question.pk for question in questions],
+        }, follow=True)
+        return str(list(response.context['messages'])[0])
+
+    def test_close(self):
+        """Closing ends voting on the open questions only."""
+        message = self.run_action('close_polls', [self.open, self.closed])
+        self.assertRegex(message, r'^Closed 1 poll\(s\) in \d+ ms\.$')
+        self.open.refresh_from_db()
+        self.assertFalse(self.open.can_vote())
+        self.assertEqual(Question.Status.CLOSED, self.open.status)
+
+    def test_extend(self):
+        """Extending reopens a closed question for the extension period."""
+        message = self.run_action('extend_polls', [self.open, self.closed])
+        self.assertRegex(message, r'^Extended 1 poll\(s\)')
+        self.closed.refresh_from_db()
+        self.assertTrue(self.closed.can_vote())
+        self.assertEqual(Question.Status.OPEN, self.closed.status)
+        self.assertGreater(self.closed.end_date, timezone.now()
+                           + datetime.timedelta(days=6))
+
+    def test_clone(self):
+        """Cloning copies the questions and their choices, not votes."""
+        # Two reads and two inserts, in a savepoint.
+        with self.assertNumQueries(6):
+            clones = Question.objects.filter(
+                pk__in=[self.open.pk, self.closed.pk]).clone(timezone.now())
+        message = self.run_action('clone_polls', [self.open])
+        self.assertRegex(message, r'^Cloned 1 poll\(s\)')
+        self.assertEqual(['Open.', 'Closed.'],
+                         [clone.question_text for clone in clones])
+        self.assertEqual(Question.Status.CLOSED, clones[1].status)
+        self.assertEqual(2, clones[0].choice_set.count())
+        self.assertEqual(0, sum(clones[0].choice_set.values_list(
+            'vote_count', flat=True)))
+
+    def test_reset_votes(self):
+        """Resetting deletes the votes and zeroes the counters."""
+        message = self.run_action('reset_votes', [self.open])
+        self.assertRegex(message, r'^Deleted 1 vote\(s\)')
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual(0, Question.objects.with_totals().get(
+            pk=self.open.pk).total_votes)
+
+    def test_reset_votes_of_filtered_polls(self):
+        """
+        Resetting polls listed by their totals marks their live results
+        changed, and only drops the cached votes of their voters.
+        """
+        other = create_question('Other.', votes=(0,))
+        Vote.objects.create(user=self.voter, choice=other.choice_set.first())
+        hub = LiveResults(interval=0)
+        channel = hub.subscribe(self.open)
+        hub.refresh(channel)
+        live._live_results = hub
+        try:
+            self.run_action('reset_votes', [self.open], votes='few')
+        finally:
+            live._live_results = None
+        self.assertTrue(channel.changed)
+        self.assertIsNone(caches['votes'].get(
+            _previous_vote_key(self.voter.id, self.open.id)))
+        self.assertIsNotNone(caches['votes'].get(
+            _previous_vote_key(self.voter.id, other.id)))
@@ -0,0 +1,210 @@
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import ratelimit
+from polls.models import Choice, Question, Vote
+
+
+def create_question(question_text, days, end_days=None, choices=0):
+    """
+    Create a question with the given 'question_text' published the given
+    number of 'days' offset to now, ending 'end_days' offset to now, with
+    the given number of choices.
+    """
+    now = timezone.now()
+    end_date = None
+    if end_days is not None:
+        end_date = now + datetime.timedelta(days=end_days)
+    question = Question.objects.create(
+        question_text=question_text,
+        pub_date=now + datetime.timedelta(days=days), end_date=end_date)
+    for count in range(1, choices + 1):
+        Choice.objects.create(question=question,
+                              choice_text=f'Choice {count}')
+    return question
+
+
+class QuestionListApiTests(TestCase):
+    def setUp(self):
+        """Set up open, closed and unpublished questions."""
+        super().setUp()
+        self.url = reverse('polls:api_questions')
+        self.closed = create_question('Closed.', days=-3, end_days=-1)
+        self.open = create_question('Open.', days=-2, choices=2)
+        self.future = create_question('Future.', days=1)
+
+    def test_list_published(self):
+        """The list has the published questions, newest first, in a query."""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        data = response.json()
+        self.assertEqual(['Open.', 'Closed.'],
+                         [item['question_text'] for item in data['results']])
+        self.assertEqual([True, False],
+                         [item['is_open'] for item in data['results']])
+        self.assertIsNone(data['next'])
+
+    def test_filter_by_state(self):
+        """?state= keeps the open or the closed questions."""
+        for state, expected in (('open', ['Open.']), ('closed', ['Closed.'])):
+            data = self.client.get(self.url, {'state': state}).json()
+            self.assertEqual(expected, [item['question_text']
+                                        for item in data['results']])
+        response = self.client.get(self.url, {'state': 'future'})
+        self.assertEqual(400, response.status_code)
+
+    @override_settings(POLLS_STATUS_UPDATES=True)
+    def test_filter_by_materialized_state(self):
+        """
+        With status updates, ?state= filters by the materialized status
+        of the questions.
+        """
+        Question.objects.filter(pk=self.open.pk).update(
+            status=Question.Status.CLOSED)
+        data = self.client.get(self.url, {'state': 'closed'}).json()
+        self.assertEqual(['Open.', 'Closed.'], [item['question_text']
+                                                for item in data['results']])
+
+    @override_settings(POLLS_API_PAGE_SIZE=1)
+    def test_pagination(self):
+        """The next URL of a page keeps the filters and field selection."""
+        data = self.client.get(self.url, {'fields': 'id'}).json()
+        self.assertEqual([{'id': self.open.id}], data['results'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([{'id': self.closed.id}], data['results'])
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fields(self):
+        """?fields= returns only the requested fields."""
+        data = self.client.get(self.url, {'fields': 'id,total_votes'}).json()
+        self.assertEqual({'id', 'total_votes'}, set(data['results'][0]))
+        response = self.client.get(self.url, {'fields': 'id,secret'})
+        self.assertEqual(400, response.status_code)
+        self.assertIn('secret', response.json()['error'])
+
+    def test_etag(self):
+        """A client with the current copy gets 304 Not Modified."""
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        create_question('Newer.', days=-1)
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+
+
+class QuestionDetailApiTests(TestCase):
+    def setUp(self):
+        """Set up a question with two choices and a vote."""
+        super().setUp()
+        self.question = create_question('Open.', days=-1, choices=2)
+        self.first, self.second = self.question.choice_set.order_by('pk')
+        user = User.objects.create_user(username='voter')
+        Vote.objects.create(user=user, choice=self.first)
+        self.url = reverse('polls:api_question', args=(self.question.id,))
+
+    def test_detail(self):
+        """A question is returned with its tallies in one query."""
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url).json()
+        self.assertEqual('Open.', data['question_text'])
+        self.assertTrue(data['is_open'])
+        self.assertEqual(1, data['total_votes'])
+        self.assertEqual([(self.first.id, 1, 100.0),
+                          (self.second.id, 0, 0.0)],
+                         [(choice['id'], choice['votes'],
+                           choice['percentage'])
+                          for choice in data['choices']])
+
+    def test_detail_without_choices(self):
+        """A question without choices has an empty list of choices."""
+        question = create_question('Empty.', days=-1)
+        data = self.client.get(reverse('polls:api_question',
+                                       args=(question.id,))).json()
+        self.assertEqual([], data['choices'])
+
+    def test_detail_sparse_fields(self):
+        """?fields= selects the fields of the question."""
+        data = self.client.get(self.url, {'fields': 'id,is_open'}).json()
+        self.assertEqual({'id': self.question.id, 'is_open': True}, data)
+
+    def test_detail_unavailable(self):
+        """Unknown and unpublished questions are not found."""
+        future = create_question('Future.', days=1)
+        for pk in (future.id, 999):
+            response = self.client.get(reverse('polls:api_question',
+                                               args=(pk,)))
+            self.assertEqual(404, response.status_code)
+
+    def test_detail_etag(self):
+        """The ETag of a question changes with its tallies."""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        user = User.objects.create_user(username='other')
+        Vote.objects.create(user=user, choice=self.second)
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+
+
+class VoteApiTests(TestCase):
+    def setUp(self):
+        """Set up an open and a closed question and a logged in voter."""
+        super().setUp()
+        ratelimit.get_counter().clear()
+        self.question = create_question('Open.', days=-1, choices=2)
+        self.choice = self.question.choice_set.order_by('pk').first()
+        self.user = User.objects.create_user(username='voter')
+        self.client.force_login(self.user)
+        self.url = reverse('polls:api_vote', args=(self.question.id,))
+
+    def test_vote(self):
+        """A JSON vote is cast for the logged in user."""
+        response = self.client.post(self.url, {'choice': self.choice.id},
+                                    content_type='application/json')
+        self.assertEqual({'question': self.question.id,
+                          'choice': self.choice.id, 'queued': False},
+                         response.json())
+        self.assertEqual(self.choice, Vote.objects.get(user=self.user).choice)
+
+    def test_vote_form_body(self):
+        """A form encoded vote is accepted too."""
+        response = self.client.post(self.url, {'choice': self.choice.id})
+        self.assertEqual(200, response.status_code)
+
+    def test_vote_requires_login(self):
+        """Anonymous clients get 401 instead of a login redirect."""
+        self.client.logout()
+        response = self.client.post(self.url, {'choice': self.choice.id})
+        self.assertEqual(401, response.status_code)
+
+    def test_vote_invalid_choice(self):
+        """A missing or foreign choice is a bad request."""
+        other = create_question('Other.', days=-1, choices=1)
+        for body in ({}, {'choice': 'x'},
+                     {'choice': other.choice_set.get().id}):
+            response = self.client.post(self.url, json.dumps(body),
+                                        content_type='application/json')
+            self.assertEqual(400, response.status_code)
+        response = self.client.post(reverse('polls:api_vote', args=(999,)),
+                                    {'choice': self.choice.id})
+        self.assertEqual(404, response.status_code)
+
+    def test_vote_closed_question(self):
+        """Questions closed for voting refuse votes, as can_vote() says."""
+        closed = create_question('Closed.', days=-3, end_days=-1, choices=1)
+        response = self.client.post(
+            reverse('polls:api_vote', args=(closed.id,)),
+            {'choice': closed.choice_set.get().id})
+        self.assertEqual(403, response.status_code)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_vote_requires_post(self):
+        """Votes are only cast by POST requests."""
+        response = self.client.get(self.url)
+        self.assertEqual(405, response.status_code)
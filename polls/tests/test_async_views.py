@@ -0,0 +1,104 @@
+import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Question, Vote
+
+
+def create_question(question_text, days=0, choices=0):
+    """
+    Create a question with the given 'question_text' published the given
+    number of 'days' offset to now, with the given number of choices.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    question = Question.objects.create(question_text=question_text,
+                                       pub_date=time)
+    for count in range(1, choices + 1):
+        Choice.objects.create(question=question,
+                              choice_text=f'Choice {count}')
+    return question
+
+
+@override_settings(ROOT_URLCONF='mysite.async_urls')
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        """Set up an open question with two choices and a user."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question('Async question.', days=-1,
+                                        choices=2)
+        self.choice = self.question.choice_set.order_by('pk').first()
+        self.user = User.objects.create_user(username='tester',
+                                             password='testpassword123')
+
+    async def test_index(self):
+        """The async index lists the published questions."""
+        await Question.objects.acreate(
+            question_text='Future question.',
+            pub_date=timezone.now() + datetime.timedelta(days=30))
+        response = await self.async_client.get(reverse('polls:index'))
+        self.assertContains(response, 'Async question.')
+        self.assertNotContains(response, 'Future question.')
+        # The second request is served from the cached fragment.
+        response = await self.async_client.get(reverse('polls:index'))
+        self.assertContains(response, 'Async question.')
+
+    async def test_detail(self):
+        """The async detail page shows the choices of the question."""
+        response = await self.async_client.get(
+            reverse('polls:detail', args=(self.question.id,)))
+        self.assertContains(response, 'Choice 1')
+        self.assertContains(response, 'Choice 2')
+
+    async def test_detail_not_found(self):
+        """An unknown question redirects to the index with an error."""
+        response = await self.async_client.get(
+            reverse('polls:detail', args=(9999,)))
+        self.assertRedirects(response, reverse('polls:index'),
+                             fetch_redirect_response=False)
+        self.assertEqual(['Poll 9999 not found.'],
+                         [str(message)
+                          for message in get_messages(response.asgi_request)])
+
+    async def test_results(self):
+        """The async results page shows the vote totals."""
+        response = await self.async_client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        self.assertEqual(0, response.context['results']['total_votes'])
+        self.assertContains(response, 'Choice 1')
+
+    async def test_vote_requires_login(self):
+        """Anonymous users are redirected to the login page to vote."""
+        url = reverse('polls:vote', args=(self.question.id,))
+        response = await self.async_client.post(url,
+                                                {'choice': self.choice.id})
+        self.assertRedirects(response, f"{reverse('login')}?next={url}",
+                             fetch_redirect_response=False)
+        self.assertFalse(await Vote.objects.aexists())
+
+    async def test_vote(self):
+        """
+        A logged in user's vote is recorded, and the detail page then
+        shows it as the previous vote.
+        """
+        await sync_to_async(self.async_client.login)(
+            username='tester', password='testpassword123')
+        response = await self.async_client.post(
+            reverse('polls:vote', args=(self.question.id,)),
+            {'choice': self.choice.id})
+        self.assertRedirects(response, reverse('polls:results',
+                                               args=(self.question.id,)),
+                             fetch_redirect_response=False)
+        vote = await Vote.objects.aget(user=self.user)
+        self.assertEqual(self.choice.id, vote.choice_id)
+        await self.choice.arefresh_from_db()
+        self.assertEqual(1, self.choice.vote_count)
+        response = await self.async_client.get(
+            reverse('polls:detail', args=(self.question.id,)))
+        self.assertEqual(self.choice.id, response.context['previous_vote'])
@@ -0,0 +1,90 @@
+import os
+import unittest
+
+from django.db import connection
+from django.test import TestCase
+
+from polls import benchmark
+from polls.management.commands.polls_benchmark import file_test_database
+from polls.models import Choice, Question, Vote
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_is_reproducible(self):
+        """seed() creates the requested dataset with consistent counters."""
+        dataset = benchmark.seed(questions=3, choices=2, users=4, votes=10)
+        self.assertEqual(3, Question.objects.count())
+        self.assertEqual(6, Choice.objects.count())
+        self.assertEqual(10, Vote.objects.count())
+        self.assertEqual(10, sum(Choice.objects.values_list('vote_count',
+                                                            flat=True)))
+        self.assertEqual(4, len(dataset['users']))
+
+    def test_run_reports_every_view(self):
+        """run() reports latency, throughput and queries for each view."""
+        dataset = benchmark.seed(questions=3, choices=2, users=4, votes=10)
+        report = benchmark.run(dataset, requests=5)
+        self.assertEqual(benchmark.SCENARIOS, list(report))
+        for results in report.values():
+            self.assertEqual(5, results['requests'])
+            self.assertEqual(0, results['errors'])
+            self.assertLessEqual(results['p50_ms'], results['p99_ms'])
+            self.assertGreater(results['queries'], 0)
+            self.assertEqual(0, results['session_writes'])
+
+    def test_run_through_asgi(self):
+        """
+        run() drives the async views through ASGI, keyed by interface,
+        without query counts.
+        """
+        dataset = benchmark.seed(questions=3, choices=2, users=4, votes=10)
+        report = benchmark.run(dataset, scenarios=['results', 'vote'],
+                               requests=4, concurrency=2,
+                               interfaces=['asgi'])
+        self.assertEqual(['asgi:results', 'asgi:vote'], list(report))
+        for results in report.values():
+            self.assertEqual(4, results['requests'])
+            self.assertEqual(0, results['errors'])
+            self.assertIsNone(results['queries'])
+            self.assertIsNone(results['session_writes'])
+
+    def test_compare_with_baseline(self):
+        """
+        compare() reports extra queries and p95 latency slowdowns beyond
+        the tolerance, and nothing otherwise.
+        """
+        baseline = {'results': {'queries': 2.0, 'p95_ms': 10.0}}
+        self.assertEqual([], benchmark.compare(
+            {'results': {'queries': 2.0, 'p95_ms': 12.0}}, baseline))
+        self.assertEqual(2, len(benchmark.compare(
+            {'results': {'queries': 3.0, 'p95_ms': 20.0}}, baseline)))
+
+    def test_render_templates(self):
+        """
+        render_templates() times each poll page for each size without
+        querying the database.
+        """
+        with self.assertNumQueries(0):
+            report = benchmark.render_templates(sizes=[1, 10], repeat=2)
+        self.assertEqual(['index:1', 'index:10', 'detail:1', 'detail:10',
+                          'results:1', 'results:10'], list(report))
+        for results in report.values():
+            self.assertEqual(2, results['renders'])
+            self.assertGreater(results['mean_ms'], 0)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite',
+                         'Only SQLite tests in memory.')
+    def test_file_test_database(self):
+        """
+        The benchmark keeps its SQLite test database in a file that only
+        exists for the run, instead of the shared in-memory database.
+        """
+        test_settings = connection.settings_dict['TEST']
+        name = test_settings.get('NAME')
+        with file_test_database(connection):
+            directory = os.path.dirname(test_settings['NAME'])
+            self.assertTrue(os.path.isdir(directory))
+            self.assertFalse(
+                connection.creation.is_in_memory_db(test_settings['NAME']))
+        self.assertEqual(name, test_settings.get('NAME'))
+        self.assertFalse(os.path.exists(directory))
@@ -0,0 +1,66 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.models import Choice, Question, Vote
+
+
+class ResultsExportTests(TestCase):
+    def setUp(self):
+        """
+        Set up a question with two choices, two votes and a staff user.
+        """
+        super().setUp()
+        self.question = Question.objects.create(question_text='Test Question')
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text='First')
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text='Second')
+        for count in range(2):
+            user = User.objects.create_user(username=f'voter{count}')
+            Vote.objects.create(user=user, choice=self.first)
+        self.staff = User.objects.create_user(username='staff',
+                                              password='testpassword123',
+                                              is_staff=True)
+        self.url = reverse('polls:results_export', args=(self.question.id,))
+
+    def content(self, response):
+        """Join the streamed content of a response."""
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_tallies_csv(self):
+        """Anyone can export the per-choice tallies as CSV."""
+        response = self.client.get(self.url)
+        self.assertEqual('text/csv', response['Content-Type'])
+        self.assertEqual(['choice_id,choice_text,votes',
+                          f'{self.first.id},First,2',
+                          f'{self.second.id},Second,0'],
+                         self.content(response).splitlines())
+
+    def test_export_votes_requires_staff(self):
+        """Raw votes can only be exported by staff users."""
+        response = self.client.get(self.url, {'votes': '1'})
+        self.assertEqual(403, response.status_code)
+
+    def test_export_votes_jsonl(self):
+        """Staff users can export the raw votes as JSON Lines."""
+        self.client.login(username='staff', password='testpassword123')
+        response = self.client.get(self.url, {'votes': '1',
+                                              'format': 'jsonl'})
+        records = [json.loads(line)
+                   for line in self.content(response).splitlines()]
+        self.assertEqual(['voter0', 'voter1'],
+                         [record['username'] for record in records])
+        self.assertEqual({self.first.id},
+                         {record['choice_id'] for record in records})
+
+    def test_export_command(self):
+        """polls_export writes the same export to stdout."""
+        output = StringIO()
+        call_command('polls_export', self.question.id, '--votes',
+                     chunk_size=1, stdout=output)
+        self.assertEqual(3, len(output.getvalue().splitlines()))
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from polls.management.commands.polls_import import read_json
+from polls.models import Choice, Question, Vote
+
+
+class PollsImportTests(TestCase):
+    def setUp(self):
+        """Set up a temporary directory for the files to import."""
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        """Write a file to import and return its path."""
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_read_json_in_small_chunks(self):
+        """
+        A JSON array is read object by object, even when objects span
+        several chunks.
+        """
+        records = [{'id': count, 'text': 'x' * count} for count in range(20)]
+        path = self.write('records.json', json.dumps(records, indent=2))
+        self.assertEqual(records, list(read_json(path, chunk_size=7)))
+
+    def test_import_fixtures(self):
+        """
+        The project fixtures are imported in small batches and the vote
+        counters match the imported votes.
+        """
+        fixtures = [os.path.join(settings.BASE_DIR, 'data', name)
+                    for name in ('users.json', 'polls.json', 'votes.json')]
+        call_command('polls_import', *fixtures, batch_size=3,
+                     transaction_size=10, stdout=StringIO())
+        self.assertTrue(User.objects.exists())
+        self.assertTrue(Question.objects.exists())
+        self.assertTrue(Vote.objects.exists())
+        for vote in Vote.objects.select_related('choice'):
+            self.assertEqual(vote.choice.question_id, vote.question_id)
+        call_command('rebuild_vote_counts', check=True, stdout=StringIO())
+
+    def test_import_jsonl_and_csv(self):
+        """
+        Plain records are imported from JSONL and CSV files whose name
+        gives their model, and records with unknown references are
+        skipped.
+        """
+        user = User.objects.create_user(username='tester')
+        questions = self.write('questions.jsonl', '\n'.join([
+            json.dumps({'id': 1, 'question_text': 'First?',
+                        'pub_date': '2023-09-01T00:00:00Z'}),
+            json.dumps({'id': 2, 'question_text': 'Second?',
+                        'pub_date': '2023-09-02T00:00:00Z',
+                        'end_date': '2023-09-09T00:00:00Z'}),
+        ]))
+        choices = self.write('choices.csv', 'id,question,choice_text\n'
+                                            '1,1,Yes\n2,1,No\n3,9,Orphan\n')
+        votes = self.write('votes.csv', f'choice,user\n2,{user.id}\n'
+                                        f'1,{user.id + 1}\n')
+        output = StringIO()
+        call_command('polls_import', questions, choices, votes,
+                     stdout=output)
+        self.assertIn('Skipped 2 invalid record(s).', output.getvalue())
+        self.assertEqual(2, Question.objects.count())
+        self.assertEqual(2, Choice.objects.count())
+        self.assertEqual(1, Choice.objects.get(pk=2).votes)
+
+    def test_sequences_are_reset(self):
+        """
+        After an import, the sequences of the imported models are reset,
+        so new rows get primary keys after the imported ones.
+        """
+        questions = self.write('questions.jsonl', json.dumps(
+            {'id': 500, 'question_text': 'Imported?',
+             'pub_date': '2023-09-01T00:00:00Z'}))
+        with mock.patch.object(
+                connection.ops, 'sequence_reset_sql',
+                wraps=connection.ops.sequence_reset_sql) as reset:
+            call_command('polls_import', questions, stdout=StringIO())
+        self.assertEqual([Question], reset.call_args.args[1])
+        question = Question.objects.create(question_text='New?')
+        self.assertGreater(question.pk, 500)
+
+    def test_strict_import(self):
+        """With --strict, an invalid record stops the import."""
+        path = self.write('questions.jsonl',
+                          json.dumps({'question_text': 'No id?'}))
+        with self.assertRaises(CommandError):
+            call_command('polls_import', path, strict=True,
+                         stdout=StringIO())
@@ -1,6 +1,7 @@
 import datetime
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from django.urls import reverse
 
@@ -24,6 +25,11 @@ def create_question(question_text, days=0, duration=0):
 
 
 class QuestionIndexViewTests(TestCase):
+    def setUp(self):
+        """Drop the index pages cached by other tests."""
+        super().setUp()
+        cache.clear()
+
     def test_no_questions(self):
         """
         If no questions exist, an appropriate message is displayed.
@@ -78,3 +84,63 @@ class QuestionIndexViewTests(TestCase):
             response.context['latest_question_list'],
             [question2, question1],
         )
+
+    def test_open_and_ended_questions(self):
+        """
+        Questions open for voting link to their detail page and ended
+        questions are marked as ended.
+        """
+        open_question = create_question(question_text="Open question.",
+                                        days=-5, duration=10)
+        ended_question = create_question(question_text="Ended question.",
+                                         days=-5, duration=1)
+        response = self.client.get(reverse('polls:index'))
+        open_url = reverse('polls:detail', args=(open_question.id,))
+        ended_url = reverse('polls:detail', args=(ended_question.id,))
+        self.assertContains(response, f'href="{open_url}"')
+        self.assertNotContains(response, f'href="{ended_url}"')
+        self.assertContains(response, "Ended")
+
+    @override_settings(POLLS_INDEX_PAGE_SIZE=2)
+    def test_keyset_pagination(self):
+        """
+        The index page shows a page of questions and a cursor to the next
+        page, which continues after the last question shown.
+        """
+        questions = [create_question(question_text=f"Question {days}.",
+                                     days=-days) for days in range(1, 6)]
+        response = self.client.get(reverse('polls:index'))
+        page = response.context['latest_question_list']
+        self.assertEqual(questions[:2], list(page))
+        response = self.client.get(reverse('polls:index'),
+                                   {'after': page.next_cursor})
+        page = response.context['latest_question_list']
+        self.assertEqual(questions[2:4], list(page))
+        response = self.client.get(reverse('polls:index'),
+                                   {'after': page.next_cursor})
+        page = response.context['latest_question_list']
+        self.assertEqual(questions[4:], list(page))
+        self.assertIsNone(page.next_cursor)
+
+    def test_malformed_cursor(self):
+        """A malformed cursor shows the first page."""
+        question = create_question(question_text="Past question.", days=-30)
+        response = self.client.get(reverse('polls:index'),
+                                   {'after': 'not-a-cursor'})
+        self.assertEqual([question],
+                         list(response.context['latest_question_list']))
+
+    def test_cached_page(self):
+        """
+        A repeated index page is served from the cache without querying
+        the questions, and a changed question invalidates it.
+        """
+        question = create_question(question_text="Past question.", days=-30)
+        self.client.get(reverse('polls:index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Past question.")
+        question.question_text = "Changed question."
+        question.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Changed question.")
@@ -0,0 +1,129 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.ingest import VoteQueue
+from polls.models import Choice, Question, Vote
+
+
+class VoteQueueTests(TestCase):
+    def setUp(self):
+        """
+        Set up a question with two choices, a user and a vote queue
+        journaling into a temporary directory.
+        """
+        super().setUp()
+        self.question = Question.objects.create(question_text='Test Question')
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text='First')
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text='Second')
+        self.user = User.objects.create_user(username='tester',
+                                             password='testpassword123')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal_path = os.path.join(directory.name, 'votes.jsonl')
+        self.queue = VoteQueue(self.journal_path, fsync=False)
+
+    def test_flush_writes_latest_vote(self):
+        """
+        Only the latest queued vote of a user for a question is written,
+        and the vote counters follow it.
+        """
+        self.queue.submit(self.user.id, self.question.id, self.first.id)
+        self.queue.submit(self.user.id, self.question.id, self.second.id)
+        self.assertEqual(0, Vote.objects.count())
+        self.assertEqual(1, self.queue.flush())
+        vote = Vote.objects.get(user=self.user)
+        self.assertEqual(self.second, vote.choice)
+        self.second.refresh_from_db()
+        self.assertEqual(1, self.second.votes)
+
+    def test_flush_switches_existing_vote(self):
+        """A queued vote switches the user's existing vote."""
+        Vote.objects.create(user=self.user, choice=self.first)
+        self.queue.submit(self.user.id, self.question.id, self.second.id)
+        self.queue.flush()
+        self.assertEqual(self.second, Vote.objects.get(user=self.user).choice)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((0, 1), (self.first.votes, self.second.votes))
+
+    def test_pending_choice(self):
+        """A queued vote is visible until it is flushed."""
+        self.assertIsNone(self.queue.pending_choice(self.user.id,
+                                                    self.question.id))
+        self.queue.submit(self.user.id, self.question.id, self.first.id)
+        self.assertEqual(self.first.id, self.queue.pending_choice(
+            self.user.id, self.question.id))
+        self.queue.flush()
+        self.assertIsNone(self.queue.pending_choice(self.user.id,
+                                                    self.question.id))
+
+    def crash(self, queue):
+        """Drop a queue without flushing it, as if its process died."""
+        queue._journal.close()
+        queue._journal_lock.close()
+
+    def test_recover_from_journal(self):
+        """
+        Votes not flushed by a stopped process are recovered from the
+        journal by the next queue, which removes the journal once they
+        are written.
+        """
+        self.queue.submit(self.user.id, self.question.id, self.first.id)
+        self.crash(self.queue)
+        recovered = VoteQueue(self.journal_path, fsync=False)
+        self.assertEqual(self.first.id, recovered.pending_choice(
+            self.user.id, self.question.id))
+        recovered.stop()
+        self.assertEqual(self.first, Vote.objects.get(user=self.user).choice)
+        self.assertFalse(os.path.exists(self.journal_path))
+
+    def test_journal_of_one_process(self):
+        """A journal cannot be used by two running queues."""
+        with self.assertRaises(RuntimeError):
+            VoteQueue(self.journal_path, fsync=False)
+
+    def test_recover_orphaned_journals(self):
+        """
+        A queue recovers the journals of stopped processes named after
+        its shared path, and leaves those of running ones alone.
+        """
+        stopped = VoteQueue(f'{self.journal_path}.1', fsync=False,
+                            shared_path=self.journal_path)
+        stopped.submit(self.user.id, self.question.id, self.first.id)
+        self.crash(stopped)
+        self.queue.submit(self.user.id, self.question.id, self.second.id)
+        queue = VoteQueue(f'{self.journal_path}.2', fsync=False,
+                          shared_path=self.journal_path)
+        self.assertEqual(self.first.id, queue.pending_choice(
+            self.user.id, self.question.id))
+        self.assertFalse(os.path.exists(f'{self.journal_path}.1'))
+        self.assertEqual(1, queue.flush())
+        self.assertEqual(self.second.id, self.queue.pending_choice(
+            self.user.id, self.question.id))
+        queue.stop()
+
+    def test_queued_vote_view(self):
+        """
+        In queued ingestion mode, vote() queues the vote and the detail
+        page shows it to the voter before it is flushed.
+        """
+        self.client.login(username='tester', password='testpassword123')
+        with override_settings(POLLS_VOTE_INGESTION='queued'), \
+                mock.patch('polls.views.get_vote_queue',
+                           return_value=self.queue):
+            response = self.client.post(
+                reverse('polls:vote', args=[self.question.id]),
+                {'choice': self.second.id})
+            self.assertRedirects(response, reverse('polls:results',
+                                                   args=(self.question.id,)))
+            self.assertFalse(Vote.objects.exists())
+            response = self.client.get(reverse('polls:detail',
+                                               args=(self.question.id,)))
+        self.assertEqual(self.second.id, response.context['previous_vote'])
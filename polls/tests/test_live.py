@@ -0,0 +1,154 @@
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import live
+from polls.live import LiveResults, astream_results
+from polls.models import Choice, Question, Vote
+
+
+def create_question(question_text, days=0, choices=0):
+    """
+    Create a question with the given 'question_text' published the given
+    number of 'days' offset to now, with the given number of choices.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    question = Question.objects.create(question_text=question_text,
+                                       pub_date=time)
+    for count in range(1, choices + 1):
+        Choice.objects.create(question=question,
+                              choice_text=f'Choice {count}')
+    return question
+
+
+def parse_event(event):
+    """Return the data of a Server-Sent Event as a dict."""
+    for line in event.splitlines():
+        if line.startswith('data: '):
+            return json.loads(line[len('data: '):])
+    return None
+
+
+class LiveResultsTests(TestCase):
+    def setUp(self):
+        """Set up a question with two choices and a voter."""
+        super().setUp()
+        self.question = create_question('Live question.', days=-1, choices=2)
+        self.choice = self.question.choice_set.order_by('pk').first()
+        self.user = User.objects.create_user(username='voter',
+                                             password='testpassword123')
+
+    def test_snapshot_is_shared_by_subscribers(self):
+        """
+        However many streams watch a question, its tallies are computed
+        once per change.
+        """
+        hub = LiveResults(interval=60)
+        channels = [hub.subscribe(self.question) for _ in range(50)]
+        self.assertIs(channels[0], channels[-1])
+        with self.assertNumQueries(1):
+            for channel in channels:
+                if hub.is_due(channel):
+                    hub.refresh(channel)
+        self.assertEqual(1, channels[0].version)
+        with self.assertNumQueries(0):
+            self.assertFalse(hub.is_due(channels[0]))
+
+    def test_updates_are_coalesced(self):
+        """
+        Changes within the interval are pushed together once the
+        interval has passed.
+        """
+        hub = LiveResults(interval=60)
+        channel = hub.subscribe(self.question)
+        hub.refresh(channel)
+        Vote.objects.create(user=self.user, choice=self.choice)
+        hub.mark_changed([self.question.id])
+        self.assertFalse(hub.is_due(channel))
+        channel.computed_at -= 60
+        self.assertTrue(hub.is_due(channel))
+        hub.refresh(channel)
+        self.assertEqual(2, channel.version)
+        self.assertEqual(1, channel.snapshot['total_votes'])
+
+    def test_vote_marks_channel_changed(self):
+        """A vote cast by the vote view marks its channel changed."""
+        hub = LiveResults(interval=0)
+        channel = hub.subscribe(self.question)
+        hub.refresh(channel)
+        live._live_results = hub
+        self.client.login(username='voter', password='testpassword123')
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('polls:vote',
+                                         args=(self.question.id,)),
+                                 {'choice': self.choice.id})
+        finally:
+            live._live_results = None
+        self.assertTrue(channel.changed)
+
+    def test_unsubscribe_drops_channel(self):
+        """The channel of a question is dropped with its last stream."""
+        hub = LiveResults()
+        first = hub.subscribe(self.question)
+        second = hub.subscribe(self.question)
+        hub.unsubscribe(first)
+        hub.mark_changed([self.question.id])
+        hub.unsubscribe(second)
+        self.assertIsNot(first, hub.subscribe(self.question))
+
+    async def test_stream_events(self):
+        """The stream sends the retry delay, then the current tallies."""
+        hub = LiveResults(interval=0)
+        events = astream_results(hub, self.question, timeout=60)
+        self.assertEqual('retry: 0\n\n', await anext(events))
+        results = parse_event(await anext(events))
+        self.assertEqual(self.question.id, results['id'])
+        self.assertEqual(0, results['total_votes'])
+        await events.aclose()
+        self.assertEqual({}, hub._channels)
+
+    @override_settings(ROOT_URLCONF='mysite.async_urls',
+                       POLLS_LIVE_RESULTS_TIMEOUT=0)
+    async def test_stream_view(self):
+        """The async stream endpoint answers with an event stream."""
+        response = await self.async_client.get(
+            reverse('polls:results_stream', args=(self.question.id,)))
+        self.assertEqual('text/event-stream', response['Content-Type'])
+        self.assertEqual('no-cache', response['Cache-Control'])
+        content = b''.join([chunk async for chunk
+                            in response.streaming_content])
+        self.assertIn('retry:', content.decode())
+
+    @override_settings(ROOT_URLCONF='mysite.async_urls')
+    async def test_stream_view_unpublished(self):
+        """Unpublished questions have no results stream."""
+        future = await sync_to_async(create_question)('Future question.',
+                                                      days=30)
+        response = await self.async_client.get(
+            reverse('polls:results_stream', args=(future.id,)))
+        self.assertEqual(404, response.status_code)
+
+    def test_no_stream_under_wsgi(self):
+        """
+        The sync views tell browsers not to open a stream, and the
+        results page does not ask for one.
+        """
+        response = self.client.get(reverse('polls:results_stream',
+                                           args=(self.question.id,)))
+        self.assertEqual(204, response.status_code)
+        response = self.client.get(reverse('polls:results',
+                                           args=(self.question.id,)))
+        self.assertNotContains(response, 'EventSource')
+
+    @override_settings(ROOT_URLCONF='mysite.async_urls')
+    async def test_async_results_page_streams(self):
+        """The async results page opens the live results stream."""
+        response = await self.async_client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, 'EventSource')
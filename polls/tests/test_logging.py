@@ -0,0 +1,102 @@
+import json
+import logging
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from polls.log import (JsonFormatter, QueueLogHandler, SamplingFilter,
+                       counters)
+from polls.models import Choice, Question
+
+
+def make_record(message, *args, level=logging.INFO, **fields):
+    """Return a record of the polls logger with the given extra fields."""
+    record = logging.LogRecord('polls', level, __file__, 1, message, args,
+                               None)
+    record.__dict__.update(fields)
+    return record
+
+
+class LogPipelineTests(SimpleTestCase):
+    def setUp(self):
+        """Reset the sampling and drop counters."""
+        super().setUp()
+        counters.clear()
+
+    def test_json_format(self):
+        """A record is formatted as JSON with its structured fields."""
+        record = make_record('%s voted from %s', 'voter', '10.0.0.1',
+                             event='vote.cast', user_id=1, question_id=2,
+                             choice_id=3, ip='10.0.0.1')
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual('voter voted from 10.0.0.1', data['message'])
+        self.assertEqual('INFO', data['level'])
+        self.assertEqual(('vote.cast', 1, 2, 3, '10.0.0.1'),
+                         (data['event'], data['user_id'], data['question_id'],
+                          data['choice_id'], data['ip']))
+
+    def test_handler_writes_from_listener(self):
+        """Queued records are written as JSON lines by the listener."""
+        stream = StringIO()
+        handler = QueueLogHandler(maxsize=10, stream=stream)
+        handler.setFormatter(JsonFormatter())
+        handler.handle(make_record('first'))
+        handler.handle(make_record('second'))
+        handler.close()
+        messages = [json.loads(line)['message']
+                    for line in stream.getvalue().splitlines()]
+        self.assertEqual(['first', 'second'], messages)
+
+    def test_full_queue_drops_records(self):
+        """Records logged while the queue is full are dropped and counted."""
+        handler = QueueLogHandler(maxsize=1, stream=StringIO())
+        handler.listener.stop()
+        handler.running = False
+        for _ in range(3):
+            handler.handle(make_record('burst', event='vote.cast'))
+        self.assertEqual(2, counters.dropped['vote.cast'])
+        self.assertIn('polls_log_records_dropped_total{event="vote.cast"} 2',
+                      counters.render())
+
+    def test_sampling(self):
+        """
+        Sampled events are skipped at their rate and counted, while
+        warnings are always kept.
+        """
+        sampling = SamplingFilter({'vote.login': 0.0})
+        self.assertFalse(sampling.filter(make_record('login',
+                                                     event='vote.login')))
+        self.assertTrue(sampling.filter(make_record(
+            'failed', level=logging.WARNING, event='vote.login')))
+        self.assertTrue(sampling.filter(make_record('cast',
+                                                    event='vote.cast')))
+        self.assertEqual(1, counters.sampled_out['vote.login'])
+
+
+class VoteLoggingTests(TestCase):
+    def setUp(self):
+        """Set up a question with a choice and a logged in voter."""
+        super().setUp()
+        self.question = Question.objects.create(question_text='Logged?')
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text='Yes')
+        self.user = User.objects.create_user(username='voter',
+                                             password='password123')
+        self.client.force_login(self.user)
+
+    def test_vote_records(self):
+        """A vote logs the login and the vote with structured fields."""
+        with self.assertLogs('polls', 'INFO') as logs:
+            self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                             {'choice': self.choice.id},
+                             REMOTE_ADDR='10.0.0.1')
+        login, cast = logs.records
+        self.assertEqual('vote.login', login.event)
+        self.assertEqual('voter logged in from 10.0.0.1', login.getMessage())
+        self.assertEqual('vote.cast', cast.event)
+        self.assertEqual((self.user.id, self.question.id, self.choice.id,
+                          '10.0.0.1'),
+                         (cast.user_id, cast.question_id, cast.choice_id,
+                          cast.ip))
@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.metrics import registry
+from polls.models import Choice, Question
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        """Set up a question with a choice, a staff user and no metrics."""
+        super().setUp()
+        registry.clear()
+        self.question = Question.objects.create(question_text='Test Question')
+        Choice.objects.create(question=self.question, choice_text='Choice')
+        self.staff = User.objects.create_user(username='staff',
+                                              password='testpassword123',
+                                              is_staff=True)
+
+    def test_metrics_require_staff(self):
+        """Only staff users can read the metrics."""
+        response = self.client.get(reverse('polls:metrics'))
+        self.assertEqual(302, response.status_code)
+
+    def test_metrics_by_view(self):
+        """
+        The metrics endpoint exports the latency, queries and template
+        render time of each view in the Prometheus text format.
+        """
+        self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.client.login(username='staff', password='testpassword123')
+        response = self.client.get(reverse('polls:metrics'))
+        content = response.content.decode()
+        self.assertIn('# TYPE polls_request_duration_seconds histogram',
+                      content)
+        self.assertIn('polls_request_duration_seconds_count{view="results"} 2',
+                      content)
+        # The second results page is served from the page cache.
+        self.assertIn('polls_db_queries_sum{view="results"} 2.000000',
+                      content)
+        self.assertIn('polls_template_render_seconds_count{view="results"}',
+                      content)
+
+    @override_settings(POLLS_QUERY_BUDGETS={'results': 1})
+    def test_query_budget_warning(self):
+        """A view running more queries than its budget logs a warning."""
+        with self.assertLogs('polls', 'WARNING') as logs:
+            self.client.get(reverse('polls:results',
+                                    args=(self.question.id,)))
+        self.assertIn('results ran 2 queries, over its budget of 1',
+                      logs.output[0])
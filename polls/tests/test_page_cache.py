@@ -0,0 +1,90 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Question
+
+
+class AnonymousPageCacheTests(TestCase):
+    def setUp(self):
+        """Set up a published question with a choice and a voter."""
+        super().setUp()
+        cache.clear()
+        self.question = Question.objects.create(
+            question_text='Cached question.',
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text='Choice')
+        self.user = User.objects.create_user(username='voter',
+                                             password='testpassword123')
+        self.results_url = reverse('polls:results', args=(self.question.id,))
+
+    def test_repeated_page_is_cached(self):
+        """A repeated anonymous page is served without any query."""
+        first = self.client.get(self.results_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.results_url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertIn('Cookie', second['Vary'])
+
+    def test_conditional_get(self):
+        """
+        A request with the current ETag or Last-Modified time gets a
+        304 Not Modified response.
+        """
+        response = self.client.get(self.results_url)
+        not_modified = self.client.get(
+            self.results_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, not_modified.status_code)
+        self.assertEqual(b'', not_modified.content)
+        not_modified = self.client.get(
+            self.results_url,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(304, not_modified.status_code)
+
+    def test_vote_invalidates_results(self):
+        """A vote changes the ETag and content of the results page."""
+        response = self.client.get(self.results_url)
+        voter = self.client_class()
+        voter.login(username='voter', password='testpassword123')
+        with self.captureOnCommitCallbacks(execute=True):
+            voter.post(reverse('polls:vote', args=(self.question.id,)),
+                       {'choice': self.choice.id})
+        changed = self.client.get(self.results_url,
+                                  HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(200, changed.status_code)
+        self.assertNotEqual(response['ETag'], changed['ETag'])
+        self.assertEqual(1, changed.context['results']['total_votes'])
+
+    def test_poll_change_invalidates_index(self):
+        """Editing a poll, e.g. in the admin, refreshes the index page."""
+        self.client.get(reverse('polls:index'))
+        self.question.question_text = 'Edited question.'
+        self.question.save()
+        self.assertContains(self.client.get(reverse('polls:index')),
+                            'Edited question.')
+
+    def test_authenticated_pages_are_not_cached(self):
+        """Pages of logged in users have no validators and are rendered."""
+        self.client.login(username='voter', password='testpassword123')
+        response = self.client.get(self.results_url)
+        self.assertNotIn('ETag', response)
+        self.assertContains(response, 'Voter')
+
+    @override_settings(POLLS_PAGE_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        """A page cache timeout of 0 disables the page cache."""
+        self.assertNotIn('ETag', self.client.get(self.results_url))
+
+    @override_settings(ROOT_URLCONF='mysite.async_urls')
+    async def test_async_conditional_get(self):
+        """The async pages are cached and validated the same way."""
+        response = await self.async_client.get(self.results_url)
+        not_modified = await self.async_client.get(
+            self.results_url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(304, not_modified.status_code)
@@ -0,0 +1,142 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from polls.models import Question
+
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def create_question(question_text, days, end_days=None):
+    """
+    Create a question with the given 'question_text' published the given
+    number of 'days' offset to now, ending 'end_days' offset to now.
+    """
+    now = timezone.now()
+    end_date = None
+    if end_days is not None:
+        end_date = now + datetime.timedelta(days=end_days)
+    return Question.objects.create(
+        question_text=question_text,
+        pub_date=now + datetime.timedelta(days=days), end_date=end_date)
+
+
+class QuestionStatusTests(TestCase):
+    def setUp(self):
+        """Set up a question with a one day voting window."""
+        super().setUp()
+        self.pub_date = timezone.now()
+        self.end_date = self.pub_date + datetime.timedelta(days=1)
+        self.question = Question(question_text='Boundary question.',
+                                 pub_date=self.pub_date,
+                                 end_date=self.end_date)
+
+    def test_status_before_publication(self):
+        """A question is scheduled until its publication date."""
+        self.assertEqual(Question.Status.SCHEDULED,
+                         self.question.status_at(self.pub_date - MICROSECOND))
+
+    def test_status_at_publication(self):
+        """A question opens exactly at its publication date."""
+        self.assertEqual(Question.Status.OPEN,
+                         self.question.status_at(self.pub_date))
+
+    def test_status_at_end(self):
+        """A question is still open exactly at its end date."""
+        self.assertEqual(Question.Status.OPEN,
+                         self.question.status_at(self.end_date))
+
+    def test_status_after_end(self):
+        """A question closes right after its end date."""
+        self.assertEqual(Question.Status.CLOSED,
+                         self.question.status_at(self.end_date + MICROSECOND))
+
+    def test_status_without_end_date(self):
+        """A question without an end date never closes."""
+        self.question.end_date = None
+        far_future = self.pub_date + datetime.timedelta(days=3650)
+        self.assertEqual(Question.Status.OPEN,
+                         self.question.status_at(far_future))
+
+    def test_save_sets_status(self):
+        """Saving a question materializes its status from its dates."""
+        scheduled = create_question('Scheduled.', days=1)
+        closed = create_question('Closed.', days=-2, end_days=-1)
+        self.assertEqual(Question.Status.SCHEDULED, scheduled.status)
+        self.assertEqual(Question.Status.CLOSED, closed.status)
+        closed.end_date = None
+        closed.save()
+        closed.refresh_from_db()
+        self.assertEqual(Question.Status.OPEN, closed.status)
+
+
+class UpdateStatusTests(TestCase):
+    def setUp(self):
+        """Set up a scheduled, an open and an ending question."""
+        super().setUp()
+        self.scheduled = create_question('Scheduled.', days=1)
+        self.open = create_question('Open.', days=-1)
+        self.ending = create_question('Ending.', days=-1, end_days=2)
+
+    def test_update_status_at_boundaries(self):
+        """
+        Questions change status exactly at their publication date and
+        right after their end date, with one UPDATE per new status.
+        """
+        with self.assertNumQueries(3):
+            self.assertEqual(0, Question.objects.update_status(
+                self.scheduled.pub_date - MICROSECOND))
+        self.assertEqual(1, Question.objects.update_status(
+            self.scheduled.pub_date))
+        self.assertEqual(0, Question.objects.update_status(
+            self.ending.end_date))
+        self.assertEqual(1, Question.objects.update_status(
+            self.ending.end_date + MICROSECOND))
+        self.ending.refresh_from_db()
+        self.assertEqual(Question.Status.CLOSED, self.ending.status)
+
+    @override_settings(POLLS_STATUS_UPDATES=True)
+    def test_by_materialized_status(self):
+        """
+        With status updates, by_status() filters by the materialized
+        status, which moves when update_status() runs.
+        """
+        later = self.ending.end_date + MICROSECOND
+        open_questions = Question.objects.by_status(Question.Status.OPEN,
+                                                    later).order_by('pk')
+        self.assertQuerysetEqual(open_questions, [self.open, self.ending])
+        Question.objects.update_status(later)
+        self.assertQuerysetEqual(open_questions.all(),
+                                 [self.scheduled, self.open])
+
+    def test_by_status_from_dates(self):
+        """Without status updates, by_status() compares the dates."""
+        later = self.ending.end_date + MICROSECOND
+        self.assertQuerysetEqual(
+            Question.objects.by_status(Question.Status.OPEN,
+                                       later).order_by('pk'),
+            [self.scheduled, self.open])
+
+    def test_next_transition(self):
+        """The next transition is the earliest opening or closing."""
+        now = timezone.now()
+        self.assertEqual(self.scheduled.pub_date,
+                         Question.objects.next_transition(now))
+        self.assertEqual(self.ending.end_date + MICROSECOND,
+                         Question.objects.next_transition(
+                             self.scheduled.pub_date))
+        self.assertIsNone(Question.objects.next_transition(
+            self.ending.end_date + MICROSECOND))
+
+    def test_command(self):
+        """update_poll_status moves the statuses of due questions."""
+        Question.objects.filter(pk=self.scheduled.pk).update(
+            pub_date=timezone.now() - datetime.timedelta(seconds=1))
+        out = StringIO()
+        call_command('update_poll_status', stdout=out)
+        self.assertIn('status of 1 question(s)', out.getvalue())
+        self.scheduled.refresh_from_db()
+        self.assertEqual(Question.Status.OPEN, self.scheduled.status)
@@ -0,0 +1,70 @@
+import unittest
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+from django.utils import timezone
+
+from polls.models import Choice, Question, Vote
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite',
+                     'EXPLAIN QUERY PLAN output is specific to SQLite.')
+class HotQueryPlanTests(TestCase):
+    def setUp(self):
+        """Set up a question with a choice and a vote."""
+        super().setUp()
+        self.now = timezone.now()
+        self.question = Question.objects.create(question_text='Test Question')
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text='Choice')
+        self.user = User.objects.create_user(username='tester')
+        Vote.objects.create(user=self.user, choice=self.choice)
+
+    def assertUsesIndex(self, queryset):
+        """
+        Assert that the EXPLAIN QUERY PLAN of a queryset reads through an
+        index and never scans a whole table.
+        """
+        plan = queryset.explain()
+        self.assertIn('INDEX', plan)
+        for line in plan.splitlines():
+            if 'SCAN' in line:
+                self.assertIn('INDEX', line, f'Table scan in plan:\n{plan}')
+
+    def test_index_query(self):
+        """The index page lists published questions through an index."""
+        self.assertUsesIndex(Question.objects.filter(
+            pub_date__lte=self.now).order_by('-pub_date'))
+
+    def test_index_next_page_query(self):
+        """The next index page is read through an index."""
+        self.assertUsesIndex(Question.objects.published(self.now).after(
+            self.question.pub_date, self.question.pk
+        ).with_open_state(self.now).order_by('-pub_date', '-pk'))
+
+    def test_open_questions_query(self):
+        """Questions open for voting are found through an index."""
+        self.assertUsesIndex(Question.objects.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=self.now),
+            pub_date__lte=self.now))
+
+    def test_ended_questions_query(self):
+        """Questions whose voting has ended are found through an index."""
+        self.assertUsesIndex(Question.objects.filter(end_date__lt=self.now))
+
+    def test_previous_vote_query(self):
+        """The vote of a user for a question is found through an index."""
+        self.assertUsesIndex(Vote.objects.filter(
+            user=self.user, question=self.question
+        ).values_list('choice_id', flat=True))
+
+    def test_results_queries(self):
+        """
+        The results of a question and the votes of a choice are read
+        through an index.
+        """
+        self.assertUsesIndex(self.question.choice_set.order_by('pk').values(
+            'id', 'choice_text', 'vote_count'))
+        self.assertUsesIndex(Vote.objects.filter(choice=self.choice))
@@ -0,0 +1,136 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from polls import ratelimit
+from polls.models import Choice, Question, Vote
+from polls.ratelimit import CacheWindows, TokenBuckets, parse_rate
+
+
+class CounterTests(SimpleTestCase):
+    def test_parse_rate(self):
+        """Rates are a number of requests per second, minute, hour or day."""
+        self.assertEqual((20, 60), parse_rate('20/m'))
+        self.assertEqual((5, 3600), parse_rate('5/hour'))
+
+    def test_token_bucket(self):
+        """A bucket allows a burst, then refills at its rate."""
+        buckets = TokenBuckets()
+        with mock.patch('time.monotonic', return_value=100.0):
+            self.assertEqual([0, 0, 0], [buckets.hit('key', 3, 60)
+                                         for _ in range(3)])
+            self.assertAlmostEqual(20.0, buckets.hit('key', 3, 60))
+            self.assertEqual(0, buckets.hit('other', 3, 60))
+        with mock.patch('time.monotonic', return_value=120.0):
+            self.assertEqual(0, buckets.hit('key', 3, 60))
+
+    def test_least_recently_used_buckets_are_dropped(self):
+        """Beyond the key limit, the least recently used bucket is dropped."""
+        buckets = TokenBuckets(max_keys=2)
+        with mock.patch('time.monotonic', return_value=100.0):
+            buckets.hit('first', 3, 60)
+            buckets.hit('second', 3, 60)
+            buckets.hit('first', 3, 60)
+            buckets.hit('third', 3, 60)
+        self.assertEqual(['first', 'third'], list(buckets._buckets))
+
+    def test_cache_windows(self):
+        """
+        The sliding window counts the part of the previous window it
+        still covers.
+        """
+        windows = CacheWindows()
+        with mock.patch('time.time', return_value=5990.0):
+            self.assertEqual([0, 0], [windows.hit('key', 2, 60)
+                                      for _ in range(2)])
+        # Half of the previous window is covered: 1 + 2 / 2 requests.
+        with mock.patch('time.time', return_value=6030.0):
+            self.assertEqual(0, windows.hit('key', 2, 60))
+        with mock.patch('time.time', return_value=6036.0):
+            self.assertAlmostEqual(24.0, windows.hit('key', 2, 60))
+
+
+@override_settings(POLLS_RATE_LIMITS={'vote': {'ip': '2/m', 'user': '1/m'},
+                                      'signup': {'ip': '1/h'}})
+class RateLimitViewTests(TestCase):
+    def setUp(self):
+        """Set up a question with a choice, a voter and empty buckets."""
+        super().setUp()
+        ratelimit.get_counter().clear()
+        self.addCleanup(ratelimit.get_counter().clear)
+        self.question = Question.objects.create(question_text='Limited?')
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text='Yes')
+        self.user = User.objects.create_user(username='voter')
+        self.url = reverse('polls:vote', args=(self.question.id,))
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_user_limit(self):
+        """Over the user limit, a vote is refused before any query."""
+        self.client.force_login(self.user)
+        self.client.post(self.url, {'choice': self.choice.id})
+        # The session is read from the cache.
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, {'choice': self.choice.id})
+        self.assertEqual(429, response.status_code)
+        self.assertEqual('60', response['Retry-After'])
+        self.assertEqual(1, Vote.objects.count())
+
+    def test_ip_limit(self):
+        """Over the IP limit, requests are refused whoever sends them."""
+        for _ in range(2):
+            self.client.post(self.url, {'choice': self.choice.id})
+        response = self.client.post(self.url, {'choice': self.choice.id})
+        self.assertEqual(429, response.status_code)
+        response = self.client.post(self.url, {'choice': self.choice.id},
+                                    REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(302, response.status_code)
+
+    def test_forwarded_for_is_ignored(self):
+        """Clients cannot escape the IP limit with X-Forwarded-For."""
+        for count in range(3):
+            response = self.client.post(
+                self.url, {'choice': self.choice.id},
+                HTTP_X_FORWARDED_FOR=f'10.0.0.{count}')
+        self.assertEqual(429, response.status_code)
+
+    @override_settings(POLLS_TRUSTED_PROXIES=1)
+    def test_trusted_proxy(self):
+        """
+        Behind a proxy, the limit is keyed on the address the proxy
+        appended to X-Forwarded-For, not on entries sent by the client.
+        """
+        for count in range(3):
+            response = self.client.post(
+                self.url, {'choice': self.choice.id},
+                HTTP_X_FORWARDED_FOR=f'10.0.0.{count}, 192.0.2.1')
+        self.assertEqual(429, response.status_code)
+        response = self.client.post(self.url, {'choice': self.choice.id},
+                                    HTTP_X_FORWARDED_FOR='192.0.2.2')
+        self.assertEqual(302, response.status_code)
+
+    def test_get_is_not_limited(self):
+        """Only POST requests are counted."""
+        for _ in range(3):
+            response = self.client.get(reverse('signup'))
+        self.assertEqual(200, response.status_code)
+
+    def test_signup_limit(self):
+        """Signups are limited per IP address."""
+        form = {'username': 'new', 'password1': 'a-Long-pass-123',
+                'password2': 'a-Long-pass-123'}
+        self.client.post(reverse('signup'), form)
+        response = self.client.post(reverse('signup'), form)
+        self.assertEqual(429, response.status_code)
+
+    @override_settings(ROOT_URLCONF='mysite.async_urls')
+    async def test_async_vote_limit(self):
+        """The async vote view is limited the same way."""
+        for _ in range(2):
+            await self.async_client.post(self.url, {'choice': self.choice.id})
+        response = await self.async_client.post(self.url,
+                                                {'choice': self.choice.id})
+        self.assertEqual(429, response.status_code)
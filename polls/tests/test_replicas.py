@@ -0,0 +1,142 @@
+import datetime
+import unittest
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Question, Vote
+from polls.routers import ReplicaRouter, RoutingState, current_state
+
+REPLICATED_MODELS = [User, Question, Choice, Vote]
+
+
+def sync_replica(alias='replica'):
+    """Replace the rows of the replicated models in a replica."""
+    for model in reversed(REPLICATED_MODELS):
+        model.objects.using(alias).all().delete()
+    for model in REPLICATED_MODELS:
+        model.objects.using(alias).bulk_create(
+            model.objects.using('default').order_by('pk'))
+
+
+@override_settings(POLLS_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        """Set up the router and the state of a request."""
+        super().setUp()
+        self.router = ReplicaRouter()
+        self.state = RoutingState()
+        token = current_state.set(self.state)
+        self.addCleanup(current_state.reset, token)
+
+    def test_reads_go_to_replicas(self):
+        """Reads of polls models in a request go to a replica."""
+        self.assertEqual('replica', self.router.db_for_read(Question))
+
+    def test_other_apps_read_primary(self):
+        """Reads of other apps, like users and sessions, stay on primary."""
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_reads_outside_requests_go_to_primary(self):
+        """Reads outside a request, e.g. in commands, use the primary."""
+        current_state.set(None)
+        self.assertIsNone(self.router.db_for_read(Question))
+
+    def test_reads_after_write_go_to_primary(self):
+        """Once a request writes, its reads go to the primary."""
+        self.assertEqual('default', self.router.db_for_write(Vote))
+        self.assertIsNone(self.router.db_for_read(Question))
+
+    def test_pinned_reads_go_to_primary(self):
+        """A client that wrote recently reads from the primary."""
+        self.state.pinned = True
+        self.assertIsNone(self.router.db_for_read(Question))
+
+    @override_settings(POLLS_REPLICAS=[])
+    def test_no_replicas(self):
+        """Without replicas every read goes to the primary."""
+        self.assertIsNone(self.router.db_for_read(Question))
+
+
+@unittest.skipUnless(connections['default'].vendor == 'sqlite',
+                     'The replica stand-in is a second SQLite database.')
+@override_settings(POLLS_REPLICAS=['replica'])
+class ReplicaReadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Add a second SQLite database standing in for a read replica, for
+        these tests only. sync_replica() copies the primary into it the
+        way replication would.
+        """
+        default = connections.settings['default']
+        connections.settings['replica'] = {
+            **default, 'TEST': {**default['TEST'], 'NAME': None}}
+        cls.replica_name = connections.settings['replica']['NAME']
+        connections['replica'].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        # Only declared once the alias exists, as the test runner checks
+        # and sets up the databases of every test before they run.
+        cls.databases = {'default', 'replica'}
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.remove_replica()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.remove_replica()
+
+    @classmethod
+    def remove_replica(cls):
+        """Destroy the replica database and drop its alias."""
+        connections['replica'].creation.destroy_test_db(cls.replica_name,
+                                                        verbosity=0)
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        """Set up a question with a choice and a voter, replicated."""
+        super().setUp()
+        self.question = Question.objects.create(
+            question_text='Replicated question.',
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text='Choice')
+        User.objects.create_user(username='voter', password='password123')
+        sync_replica()
+
+    def get_total_votes(self, client):
+        """Return the total votes shown on the results page."""
+        response = client.get(reverse('polls:results',
+                                      args=(self.question.id,)))
+        return response.context['results']['total_votes']
+
+    def test_voter_reads_own_vote_from_primary(self):
+        """
+        After voting, the voter reads the primary and sees their vote,
+        while other clients read the replica until it catches up.
+        """
+        self.client.login(username='voter', password='password123')
+        response = self.client.post(reverse('polls:vote',
+                                            args=(self.question.id,)),
+                                    {'choice': self.choice.id})
+        self.assertIn('polls_primary', response.cookies)
+        self.assertEqual(1, Vote.objects.using('default').count())
+        self.assertEqual(0, Vote.objects.using('replica').count())
+        self.assertEqual(1, self.get_total_votes(self.client))
+        other_client = self.client_class()
+        self.assertEqual(0, self.get_total_votes(other_client))
+        sync_replica()
+        self.assertEqual(1, self.get_total_votes(other_client))
+
+    def test_reads_do_not_pin(self):
+        """Requests that only read do not pin the client."""
+        response = self.client.get(reverse('polls:results',
+                                           args=(self.question.id,)))
+        self.assertNotIn('polls_primary', response.cookies)
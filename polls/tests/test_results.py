@@ -0,0 +1,85 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Question, Vote
+
+
+def create_question(question_text, days=0, choices=0):
+    """
+    Create a question with the given 'question_text' published the given
+    number of 'days' offset to now, with the given number of choices.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    question = Question.objects.create(question_text=question_text,
+                                       pub_date=time)
+    for count in range(1, choices + 1):
+        Choice.objects.create(question=question,
+                              choice_text=f'Choice {count}')
+    return question
+
+
+class QuestionResultsViewTests(TestCase):
+    def setUp(self):
+        """Set up a question with three choices and votes for two of them."""
+        super().setUp()
+        self.question = create_question('Results question.', days=-1,
+                                        choices=3)
+        first, second, _ = self.question.choice_set.order_by('pk')
+        for count in range(3):
+            user = User.objects.create_user(username=f'voter{count}')
+            Vote.objects.create(user=user,
+                                choice=first if count < 2 else second)
+
+    def test_results_totals_and_percentages(self):
+        """
+        The results page shows the votes and percentage of each choice
+        and the total votes of the question.
+        """
+        response = self.client.get(reverse('polls:results',
+                                           args=(self.question.id,)))
+        results = response.context['results']
+        self.assertEqual(3, results['total_votes'])
+        self.assertEqual([2, 1, 0],
+                         [choice['votes'] for choice in results['choices']])
+        self.assertEqual([66.7, 33.3, 0.0],
+                         [choice['percentage']
+                          for choice in results['choices']])
+        self.assertContains(response, '66.7%')
+
+    def test_results_query_count_is_constant(self):
+        """
+        The results page costs the same number of queries regardless of
+        the number of choices.
+        """
+        many = create_question('Many choices.', days=-1, choices=20)
+        with CaptureQueriesContext(connection) as few_queries:
+            self.client.get(reverse('polls:results',
+                                    args=(self.question.id,)))
+        with CaptureQueriesContext(connection) as many_queries:
+            self.client.get(reverse('polls:results', args=(many.id,)))
+        self.assertEqual(len(few_queries), len(many_queries))
+
+    def test_results_json(self):
+        """The JSON variant returns the same results as the results page."""
+        response = self.client.get(reverse('polls:results_json',
+                                           args=(self.question.id,)))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(self.question.get_results(), response.json())
+
+    def test_results_json_not_available(self):
+        """
+        The JSON variant returns 404 for missing and unpublished questions.
+        """
+        future = create_question('Future question.', days=5)
+        response = self.client.get(reverse('polls:results_json',
+                                           args=(future.id,)))
+        self.assertEqual(404, response.status_code)
+        response = self.client.get(reverse('polls:results_json',
+                                           args=(future.id + 1,)))
+        self.assertEqual(404, response.status_code)
@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls.models import Choice, Question
+
+
+class SessionWriteTests(TestCase):
+    def setUp(self):
+        """Set up a question with a choice and a user."""
+        super().setUp()
+        self.question = Question.objects.create(question_text='Test Question')
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text='Choice')
+        User.objects.create_user(username='tester',
+                                 password='testpassword123')
+
+    def test_anonymous_pages_create_no_session(self):
+        """Anonymous visits to the index and results never save a session."""
+        for url in (reverse('polls:index'),
+                    reverse('polls:results', args=(self.question.id,))):
+            response = self.client.get(url)
+            self.assertNotIn('sessionid', response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    def test_vote_round_trip_writes_no_session(self):
+        """
+        Voting and reading the results with the flash message writes no
+        session, as the message travels in a signed cookie.
+        """
+        self.client.login(username='tester', password='testpassword123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('polls:vote', args=(self.question.id,)),
+                {'choice': self.choice.id}, follow=True)
+        self.assertContains(response, 'You voted for')
+        self.assertEqual([], [query['sql'] for query in queries
+                              if 'django_session' in query['sql']
+                              and not query['sql'].startswith('SELECT')])
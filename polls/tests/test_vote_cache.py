@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls.models import Choice, Question, Vote
+
+
+class PreviousVoteCacheTests(TestCase):
+    def setUp(self):
+        """
+        Set up a question with two choices and a logged in user, with
+        an empty vote cache.
+        """
+        super().setUp()
+        caches['votes'].clear()
+        self.question = Question.objects.create(question_text='Test Question')
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text='First')
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text='Second')
+        self.user = User.objects.create_user(username='tester',
+                                             password='testpassword123')
+        self.client.login(username='tester', password='testpassword123')
+        self.detail_url = reverse('polls:detail', args=(self.question.id,))
+
+    def previous_vote(self):
+        """
+        Render the detail page and return its previous vote and whether
+        the Vote table was read to find it.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail_url)
+        read_votes = any('polls_vote' in query['sql'] for query in queries)
+        return response.context['previous_vote'], read_votes
+
+    def test_returning_voter_served_from_cache(self):
+        """
+        The previous vote is read from the Vote table once, then from
+        the cache.
+        """
+        Vote.objects.create(user=self.user, choice=self.first)
+        caches['votes'].clear()
+        self.assertEqual((self.first.id, True), self.previous_vote())
+        self.assertEqual((self.first.id, False), self.previous_vote())
+
+    def test_no_vote_is_cached(self):
+        """A user without a vote is remembered as such."""
+        self.assertEqual((0, True), self.previous_vote())
+        self.assertEqual((0, False), self.previous_vote())
+
+    def test_vote_writes_through(self):
+        """vote() updates the cached vote of the user."""
+        self.previous_vote()
+        vote_url = reverse('polls:vote', args=[self.question.id])
+        self.client.post(vote_url, {'choice': self.second.id})
+        self.assertEqual((self.second.id, False), self.previous_vote())
+
+    def test_deleted_vote_is_forgotten(self):
+        """Deleting a vote drops it from the cache."""
+        vote = Vote.objects.create(user=self.user, choice=self.first)
+        self.previous_vote()
+        vote.delete()
+        self.assertEqual((0, True), self.previous_vote())
@@ -0,0 +1,166 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from polls.models import Choice, Question, Vote, VoteQuerySet
+
+
+class VoteCastTests(TestCase):
+    def setUp(self):
+        """
+        Set up a question with two choices and a user.
+        """
+        super().setUp()
+        self.question = Question.objects.create(question_text='Test Question')
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text='First')
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text='Second')
+        self.user = User.objects.create_user(username='tester',
+                                             password='testpassword123')
+
+    def test_vote_question_filled_from_choice(self):
+        """A vote saved without a question takes the question of its choice."""
+        vote = Vote.objects.create(user=self.user, choice=self.first)
+        self.assertEqual(self.question, vote.question)
+
+    def test_one_vote_per_user_and_question(self):
+        """A user cannot have two votes for the same question."""
+        Vote.objects.create(user=self.user, choice=self.first)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vote.objects.create(user=self.user, choice=self.second)
+
+    def test_cast_new_vote(self):
+        """cast() creates a vote and counts it."""
+        self.assertIsNone(Vote.objects.cast(self.user, self.first))
+        self.assertEqual(self.first, Vote.objects.get(user=self.user).choice)
+        self.first.refresh_from_db()
+        self.assertEqual(1, self.first.votes)
+
+    def test_cast_switches_vote(self):
+        """
+        cast() switches the existing vote of the user in place and moves
+        its count to the new choice.
+        """
+        Vote.objects.cast(self.user, self.first)
+        vote_id = Vote.objects.get(user=self.user).id
+        self.assertEqual(self.first.id,
+                         Vote.objects.cast(self.user, self.second))
+        vote = Vote.objects.get(user=self.user)
+        self.assertEqual((vote_id, self.second), (vote.id, vote.choice))
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((0, 1), (self.first.votes, self.second.votes))
+
+    def test_cast_same_choice_twice(self):
+        """Casting the same vote twice counts it once."""
+        Vote.objects.cast(self.user, self.first)
+        Vote.objects.cast(self.user, self.first)
+        self.first.refresh_from_db()
+        self.assertEqual(1, self.first.votes)
+
+    def test_cast_after_concurrent_first_vote(self):
+        """
+        A cast that gets the user's lock only once a concurrent first vote
+        of the same user has committed, like a double submit, reads that
+        vote and does not count it twice.
+        """
+        lock_voter = VoteQuerySet._lock_voter
+
+        def commit_other_cast(queryset, user):
+            # The other request commits while this one waits for the lock.
+            with mock.patch.object(VoteQuerySet, '_lock_voter', lock_voter):
+                Vote.objects.cast(self.user, self.first)
+            lock_voter(queryset, user)
+
+        with mock.patch.object(VoteQuerySet, '_lock_voter',
+                               commit_other_cast):
+            self.assertEqual(self.first.id,
+                             Vote.objects.cast(self.user, self.first))
+        self.first.refresh_from_db()
+        self.assertEqual(1, self.first.votes)
+        self.assertEqual(1, Vote.objects.count())
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite',
+                     'Only SQLite locks the whole database for a write.')
+@override_settings(DATABASE_ROUTERS=[])
+class SQLiteConcurrentCastTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Add a file-backed SQLite database, for these tests only, as the
+        in-memory test database is shared by the threads of this process
+        through SQLite's shared cache, which locks tables instead.
+        """
+        cls.directory = tempfile.TemporaryDirectory()
+        default = connections.settings['default']
+        connections.settings['voters'] = {
+            **default, 'TEST': {
+                **default['TEST'],
+                'NAME': os.path.join(cls.directory.name, 'voters.sqlite3')}}
+        connections['voters'].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        cls.databases = {'default', 'voters'}
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.remove_voters()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.remove_voters()
+
+    @classmethod
+    def remove_voters(cls):
+        """Close the file-backed database, drop its alias and the file."""
+        connections['voters'].close()
+        del connections['voters']
+        del connections.settings['voters']
+        cls.directory.cleanup()
+
+    def test_concurrent_casts(self):
+        """
+        Casts of many voters at once wait for each other instead of
+        failing with "database is locked".
+        """
+        question = Question.objects.using('voters').create(
+            question_text='Busy question.')
+        choices = Choice.objects.using('voters').bulk_create(
+            [Choice(question=question, choice_text='First'),
+             Choice(question=question, choice_text='Second')])
+        users = User.objects.using('voters').bulk_create(
+            [User(username=f'voter{number}') for number in range(8)])
+        start = threading.Barrier(len(users))
+        errors = []
+
+        def vote(user):
+            start.wait()
+            try:
+                for number in range(10):
+                    Vote.objects.using('voters').cast(
+                        user, choices[number % 2])
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=vote, args=(user,))
+                   for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual(
+            [0, len(users)],
+            [choice.votes for choice in Choice.objects.using(
+                'voters').order_by('pk')])
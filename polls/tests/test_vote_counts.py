@@ -0,0 +1,80 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.models import Choice, Question, Vote
+
+
+class VoteCounterTests(TestCase):
+    def setUp(self):
+        """
+        Set up a question with two choices and two users.
+        """
+        super().setUp()
+        self.question = Question.objects.create(question_text='Test Question')
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text='First')
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text='Second')
+        self.user = User.objects.create_user(username='tester',
+                                             password='testpassword123')
+        self.other = User.objects.create_user(username='other',
+                                              password='testpassword123')
+
+    def assertVotes(self, first, second):
+        """Assert the counters of both choices after reloading them."""
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((first, second),
+                         (self.first.votes, self.second.votes))
+
+    def test_new_vote_increments_counter(self):
+        """Casting a vote increments the counter of its choice."""
+        Vote.objects.create(user=self.user, choice=self.first)
+        Vote.objects.create(user=self.other, choice=self.first)
+        self.assertVotes(2, 0)
+
+    def test_switched_vote_moves_counter(self):
+        """Switching a vote moves one count between the two choices."""
+        Vote.objects.create(user=self.user, choice=self.first)
+        vote = Vote.objects.get(user=self.user)
+        vote.choice = self.second
+        vote.save()
+        self.assertVotes(0, 1)
+        vote.save()
+        self.assertVotes(0, 1)
+
+    def test_deleted_vote_decrements_counter(self):
+        """Deleting a vote, directly or by cascade, decrements its choice."""
+        vote = Vote.objects.create(user=self.user, choice=self.first)
+        Vote.objects.create(user=self.other, choice=self.first)
+        vote.delete()
+        self.assertVotes(1, 0)
+        self.other.delete()
+        self.assertVotes(0, 0)
+
+    def test_vote_view_keeps_counter(self):
+        """Voting and switching through vote() keeps the counters in sync."""
+        self.client.login(username='tester', password='testpassword123')
+        vote_url = reverse('polls:vote', args=[self.question.id])
+        self.client.post(vote_url, {'choice': self.first.id})
+        self.assertVotes(1, 0)
+        self.client.post(vote_url, {'choice': self.second.id})
+        self.assertVotes(0, 1)
+
+    def test_rebuild_vote_counts(self):
+        """
+        rebuild_vote_counts --check reports drifted counters and
+        rebuild_vote_counts repairs them from the Vote table.
+        """
+        Vote.objects.create(user=self.user, choice=self.first)
+        Choice.objects.filter(pk=self.second.pk).update(vote_count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_vote_counts', check=True, stdout=StringIO())
+        call_command('rebuild_vote_counts', stdout=StringIO())
+        self.assertVotes(1, 0)
+        call_command('rebuild_vote_counts', check=True, stdout=StringIO())
@@ -0,0 +1,172 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.ingest import VoteQueue
+from polls.models import Choice, Question, Vote, VoteEvent
+
+
+class VoteEventTests(TestCase):
+    def setUp(self):
+        """Set up a question with two choices and a user."""
+        super().setUp()
+        self.question = Question.objects.create(question_text='Test Question')
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text='First')
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text='Second')
+        self.user = User.objects.create_user(username='tester',
+                                             password='testpassword123')
+
+    def events(self):
+        """Return the choice, previous choice and IP of every event."""
+        return list(VoteEvent.objects.order_by('pk').values_list(
+            'choice_id', 'previous_choice_id', 'ip'))
+
+    def test_vote_appends_events(self):
+        """Every cast and switch is logged with its IP address."""
+        self.client.force_login(self.user)
+        url = reverse('polls:vote', args=(self.question.id,))
+        self.client.post(url, {'choice': self.first.id},
+                         REMOTE_ADDR='10.0.0.1')
+        self.client.post(url, {'choice': self.second.id},
+                         REMOTE_ADDR='10.0.0.2')
+        self.assertEqual([(self.first.id, None, '10.0.0.1'),
+                          (self.second.id, self.first.id, '10.0.0.2')],
+                         self.events())
+        self.assertTrue(VoteEvent.objects.last().is_switch)
+
+    def test_untrusted_forwarded_address_is_not_logged(self):
+        """
+        Without trusted proxies, the event keeps the peer address, not
+        an X-Forwarded-For entry the client made up.
+        """
+        self.client.force_login(self.user)
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {'choice': self.first.id}, REMOTE_ADDR='10.0.0.1',
+                         HTTP_X_FORWARDED_FOR='192.0.2.1')
+        self.assertEqual([(self.first.id, None, '10.0.0.1')], self.events())
+
+    def test_events_are_append_only(self):
+        """Events cannot be changed or deleted."""
+        Vote.objects.cast(self.user, self.first)
+        event = VoteEvent.objects.get()
+        with self.assertRaises(TypeError):
+            event.save()
+        with self.assertRaises(TypeError):
+            event.delete()
+        with self.assertRaises(TypeError):
+            VoteEvent.objects.update(ip='10.0.0.1')
+        with self.assertRaises(TypeError):
+            VoteEvent.objects.all().delete()
+
+    def test_queued_votes_append_events(self):
+        """
+        A flush logs every queued vote, including those replaced by a
+        later vote of the same user in the batch.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        queue = VoteQueue(os.path.join(directory.name, 'votes.jsonl'),
+                          fsync=False)
+        queue.submit(self.user.id, self.question.id, self.first.id,
+                     '10.0.0.1')
+        queue.submit(self.user.id, self.question.id, self.second.id,
+                     '10.0.0.1')
+        queue.stop()
+        self.assertEqual([(self.first.id, None, '10.0.0.1'),
+                          (self.second.id, self.first.id, '10.0.0.1')],
+                         self.events())
+
+    def test_replay_rebuilds_votes(self):
+        """Replaying the events restores the votes and their counters."""
+        other = User.objects.create_user(username='other')
+        Vote.objects.cast(self.user, self.first)
+        Vote.objects.cast(self.user, self.second)
+        Vote.objects.cast(other, self.second)
+        Vote.objects.filter(user=other).update(choice=self.first)
+        Vote.objects.filter(user=self.user)._raw_delete(Vote.objects.db)
+        with self.assertRaises(CommandError):
+            call_command('replay_votes', check=True, stdout=StringIO())
+        out = StringIO()
+        call_command('replay_votes', stdout=out)
+        self.assertIn('Replayed 3 event(s) into 2 vote(s)', out.getvalue())
+        self.assertEqual({self.second.id}, set(
+            Vote.objects.values_list('choice_id', flat=True)))
+        self.second.refresh_from_db()
+        self.assertEqual(2, self.second.votes)
+        call_command('replay_votes', check=True, stdout=StringIO())
+
+    def test_replay_skips_deleted_choices(self):
+        """Events of choices deleted since are not replayed."""
+        Vote.objects.cast(self.user, self.first)
+        self.first.delete()
+        call_command('replay_votes', stdout=StringIO())
+        self.assertFalse(Vote.objects.exists())
+        # The cast, and the delete of the vote cascading from the choice.
+        self.assertEqual(2, VoteEvent.objects.count())
+
+    def test_reset_votes_are_not_replayed(self):
+        """Votes reset in bulk or deleted stay deleted after a replay."""
+        other = User.objects.create_user(username='other')
+        Vote.objects.cast(self.user, self.first)
+        Vote.objects.cast(other, self.second)
+        Question.objects.filter(pk=self.question.pk).reset_votes()
+        self.assertTrue(VoteEvent.objects.last().is_delete)
+        call_command('replay_votes', check=True, stdout=StringIO())
+        Vote.objects.cast(self.user, self.second)
+        Vote.objects.get(user=self.user).delete()
+        call_command('replay_votes', stdout=StringIO())
+        self.assertFalse(Vote.objects.exists())
+        self.second.refresh_from_db()
+        self.assertEqual(0, self.second.votes)
+
+    @override_settings(POLLS_TRUSTED_PROXIES=1)
+    def test_invalid_ip_is_not_stored(self):
+        """A malformed forwarded address is logged without an IP."""
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('polls:vote', args=(self.question.id,)),
+            {'choice': self.first.id}, HTTP_X_FORWARDED_FOR='unknown')
+        self.assertEqual(302, response.status_code)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        queue = VoteQueue(os.path.join(directory.name, 'votes.jsonl'),
+                          fsync=False)
+        queue.submit(self.user.id, self.question.id, self.second.id,
+                     '1.2.3.4:5678')
+        queue.stop()
+        self.assertEqual([(self.first.id, None, None),
+                          (self.second.id, self.first.id, None)],
+                         self.events())
+
+    def test_saved_votes_are_logged(self):
+        """Votes created or switched with save() are kept by a replay."""
+        vote = Vote.objects.create(user=self.user, choice=self.first)
+        vote = Vote.objects.get(pk=vote.pk)
+        vote.choice = self.second
+        vote.save()
+        self.assertTrue(VoteEvent.objects.last().is_switch)
+        call_command('replay_votes', check=True, stdout=StringIO())
+        call_command('replay_votes', stdout=StringIO())
+        self.assertEqual(self.second, Vote.objects.get().choice)
+
+
+class FixtureVoteEventTests(TestCase):
+    def test_loaded_votes_are_logged(self):
+        """Votes loaded from the fixtures are kept by a replay."""
+        call_command('loaddata', 'data/users.json', 'data/polls.json',
+                     'data/votes.json', verbosity=0)
+        votes = set(Vote.objects.values_list('user_id', 'question_id',
+                                             'choice_id'))
+        self.assertTrue(votes)
+        call_command('replay_votes', check=True, stdout=StringIO())
+        call_command('replay_votes', stdout=StringIO())
+        self.assertEqual(votes, set(Vote.objects.values_list(
+            'user_id', 'question_id', 'choice_id')))
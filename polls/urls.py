@@ -1,11 +1,27 @@
 from django.urls import path
 
-from . import views
+from . import api, views
+from .caching import cache_anonymous_page
+from .ratelimit import rate_limit
 
 app_name = 'polls'
 urlpatterns = [
-    path('', views.IndexView.as_view(), name='index'),
+    path('', cache_anonymous_page('index')(views.IndexView.as_view()),
+         name='index'),
     path('<int:pk>/', views.DetailView.as_view(), name='detail'),
-    path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
-    path('<int:question_id>/vote/', views.vote, name='vote'),
+    path('<int:pk>/results/', cache_anonymous_page('results:{pk}')(
+        views.ResultsView.as_view()), name='results'),
+    path('<int:pk>/results/json/', views.results_json, name='results_json'),
+    path('<int:pk>/results/stream/', views.results_stream,
+         name='results_stream'),
+    path('<int:pk>/results/export', views.results_export,
+         name='results_export'),
+    path('<int:question_id>/vote/', rate_limit('vote')(views.vote),
+         name='vote'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('api/questions/', api.question_list, name='api_questions'),
+    path('api/questions/<int:pk>/', api.question_detail,
+         name='api_question'),
+    path('api/questions/<int:pk>/vote/', rate_limit('vote')(api.vote),
+         name='api_vote'),
 ]
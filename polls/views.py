@@ -1,28 +1,51 @@
-from django.http import HttpResponseRedirect, Http404
+from django.http import (HttpResponseRedirect, Http404, JsonResponse,
+                         HttpResponseForbidden, StreamingHttpResponse,
+                         HttpResponse)
 from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
 from django.views import generic
 from django.contrib import messages
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from .caching import get_previous_vote, index_version, remember_votes
+from .export import FORMATS, export_lines
+from .metrics import registry
+from .ingest import get_vote_queue
+from .log import counters, vote_fields
 from .models import Choice, Question, Vote
+from .pagination import KeysetPage
+from .ratelimit import client_address
 from logging import getLogger
 
 
 class IndexView(generic.ListView):
     """
-    IndexView displays a list of all published questions.
+    IndexView displays a page of published questions, newest first.
     """
     template_name = 'polls/index.html'
     context_object_name = 'latest_question_list'
 
     def get_queryset(self):
         """
-        Return all published questions (not including those set to be
-        published in the future).
+        Return the page of published questions (not including those set
+        to be published in the future) after the 'after' cursor, with
+        their open state evaluated in SQL at a single instant.
         """
-        return Question.objects.filter(pub_date__lte=timezone.now()
-                                       ).order_by('-pub_date')
+        now = timezone.now()
+        questions = Question.objects.published(now).with_open_state(now)
+        return KeysetPage(questions, self.request.GET.get('after'),
+                          settings.POLLS_INDEX_PAGE_SIZE)
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the key and timeout of the cached fragment of this page.
+        """
+        context = super().get_context_data(**kwargs)
+        context['index_version'] = index_version()
+        context['index_cache_timeout'] = settings.POLLS_INDEX_CACHE_TIMEOUT
+        return context
 
 
 class DetailView(generic.DetailView):
@@ -52,16 +75,11 @@ class DetailView(generic.DetailView):
             messages.error(request, message=f"Poll {kwargs['pk']} not found.")
             return redirect('polls:index')
         if question.can_vote():
-            requested_user = request.user
-            try:
-                previous_vote = Vote.objects.get(user=requested_user,
-                                                 choice__question=question
-                                                 ).choice.id
-            except (Vote.DoesNotExist, TypeError):
-                previous_vote = 0
             return render(request, self.template_name,
                           {'question': question,
-                           'previous_vote': previous_vote})
+                           'choices': question.choice_set.all(),
+                           'previous_vote': find_previous_vote(request.user,
+                                                               question.id)})
         messages.error(request,
                        message=f"Poll {kwargs['pk']} is not available "
                                f"for voting.")
@@ -89,21 +107,114 @@ class ResultsView(generic.DetailView):
             return redirect('polls:index')
         if question.is_published():
             return render(request, self.template_name,
-                          {'question': question})
+                          {'question': question,
+                           'results': question.get_results()})
         messages.error(request,
                        message=f"Poll {kwargs['pk']}'s result is not "
                                f"available.")
         return redirect('polls:index')
 
 
-def get_client_ip(request):
-    """Get the visitor’s IP address using request headers."""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
+def results_json(request, pk):
+    """
+    results_json() returns the results of a poll question as JSON,
+    or a 404 error if the results are not available.
+    """
+    try:
+        question = Question.objects.get(pk=pk)
+    except Question.DoesNotExist:
+        return JsonResponse({'error': f"Poll {pk} not found."}, status=404)
+    if not question.is_published():
+        return JsonResponse({'error': f"Poll {pk}'s result is not "
+                                      f"available."}, status=404)
+    return JsonResponse(question.get_results())
+
+
+def results_stream(request, pk):
+    """
+    results_stream() answers 204 No Content, which tells the browser not
+    to reconnect. An event stream would hold a WSGI worker for
+    settings.POLLS_LIVE_RESULTS_TIMEOUT seconds, so live results are only
+    streamed by the async views.
+    """
+    return HttpResponse(status=204)
+
+
+def event_stream_response(events):
+    """Return a streaming response of Server-Sent Events."""
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def results_export(request, pk):
+    """
+    results_export() streams the per-choice tallies of a poll question as
+    CSV or JSONL (?format=csv|jsonl), or its raw votes (?votes=1) for
+    staff users.
+    """
+    question = get_object_or_404(Question, pk=pk)
+    if not question.is_published():
+        raise Http404(f"Poll {pk}'s result is not available.")
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        export_format = 'csv'
+    votes = request.GET.get('votes') == '1'
+    if votes and not request.user.is_staff:
+        return HttpResponseForbidden("Only staff can export raw votes.")
+    lines = export_lines(question, export_format, votes=votes,
+                         chunk_size=settings.POLLS_EXPORT_CHUNK_SIZE)
+    response = StreamingHttpResponse(lines,
+                                     content_type=FORMATS[export_format][1])
+    kind = 'votes' if votes else 'results'
+    response['Content-Disposition'] = (f'attachment; filename="poll-{pk}-'
+                                       f'{kind}.{export_format}"')
+    return response
+
+
+@staff_member_required
+def metrics(request):
+    """
+    metrics() exposes the request metrics of each view and the counters
+    of the log pipeline in the Prometheus text format, for staff users
+    only.
+    """
+    return HttpResponse(registry.render() + counters.render(),
+                        content_type='text/plain; version=0.0.4')
+
+
+def find_previous_vote(user, question_id):
+    """
+    Return the choice id of the vote of a user for a question, or 0 if
+    the user has not voted for it.
+    """
+    if settings.POLLS_VOTE_INGESTION == 'queued' and user.is_authenticated:
+        # Show the user's own vote even if it is not flushed yet.
+        choice_id = get_vote_queue().pending_choice(user.id, question_id)
+        if choice_id is not None:
+            return choice_id
+    return get_previous_vote(user, question_id)
+
+
+def record_vote(user, question, choice, ip_address=None):
+    """
+    Record the vote of a user for a choice of a question, from the given
+    IP address, queued or written immediately depending on
+    settings.POLLS_VOTE_INGESTION.
+
+    :return: True if the vote was queued, False if it was written.
+    """
+    queued = settings.POLLS_VOTE_INGESTION == 'queued'
+    if queued:
+        get_vote_queue().submit(user.id, question.id, choice.id,
+                                ip_address)
     else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+        # Create a new vote, or switch the user's vote for this question
+        Vote.objects.cast(user, choice, ip_address)
+    remember_votes({(user.id, question.id): choice.id})
+    return queued
 
 
 @login_required
@@ -113,9 +224,11 @@ def vote(request, question_id):
     """
     question = get_object_or_404(Question, pk=question_id)
     requested_user = request.user
-    ip_address = get_client_ip(request)
+    ip_address = client_address(request)
     logger = getLogger('polls')
-    logger.info(f'{requested_user} logged in from {ip_address}')
+    logger.info('%s logged in from %s', requested_user, ip_address,
+                extra=vote_fields('vote.login', requested_user, question,
+                                  ip_address))
 
     if not question.can_vote():
         messages.error(request, message=f"Poll {question_id} is not available "
@@ -126,24 +239,24 @@ def vote(request, question_id):
     except (KeyError, Choice.DoesNotExist):
         previous_url = request.META.get('HTTP_REFERER')
         if 'login' not in str(previous_url):
-            logger.warning(f'{requested_user} failed to vote {question} from '
-                           f'{ip_address}')
+            logger.warning('%s failed to vote %s from %s', requested_user,
+                           question, ip_address,
+                           extra=vote_fields('vote.failed', requested_user,
+                                             question, ip_address))
             messages.error(request, message="You didn't select a choice.")
         return HttpResponseRedirect(reverse('polls:detail', args=(question.id,
                                                                   )))
 
-    try:
-        # Find a vote for this user and this question
-        selected_vote = Vote.objects.get(user=requested_user,
-                                         choice__question=question)
-        # Update his vote
-        selected_vote.choice = selected_choice
-    except Vote.DoesNotExist:
-        # No matching vote - Create a new Vote
-        selected_vote = Vote(user=requested_user, choice=selected_choice)
-    selected_vote.save()
-    logger.info(f'{requested_user} voted for {selected_choice} '
-                f'in {question} from {ip_address}')
+    if record_vote(requested_user, question, selected_choice, ip_address):
+        logger.info('%s queued a vote for %s in %s from %s', requested_user,
+                    selected_choice, question, ip_address,
+                    extra=vote_fields('vote.queued', requested_user,
+                                      question, ip_address, selected_choice))
+    else:
+        logger.info('%s voted for %s in %s from %s', requested_user,
+                    selected_choice, question, ip_address,
+                    extra=vote_fields('vote.cast', requested_user, question,
+                                      ip_address, selected_choice))
     messages.info(request, message=f"You voted for \"{selected_choice}\".")
     return HttpResponseRedirect(reverse('polls:results', args=(question.id,
                                                                )))